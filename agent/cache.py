@@ -0,0 +1,139 @@
+import time
+import asyncio
+import hashlib
+import threading
+import weakref
+from collections import OrderedDict
+import numpy as np
+
+
+class ExactPromptCache:
+    """
+    LRU cache of LLM results keyed by a hash of the model name and the exact prompt.
+
+    Entries expire after `ttl` seconds. `lock_for` / `async_lock_for` hand out one
+    lock per key so concurrent identical prompts collapse into a single LLM call.
+    Async locks are kept per event loop, since an asyncio.Lock can't be shared
+    between the loops of separate `asyncio.run` calls.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: int = 1800):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (value, timestamp)
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._async_key_locks = weakref.WeakKeyDictionary()  # event loop -> {key: asyncio.Lock}
+
+    @staticmethod
+    def make_key(model_name: str, prompt: str) -> str:
+        return hashlib.blake2b((model_name + prompt).encode()).hexdigest()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, ts = entry
+            if time.time() - ts >= self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: str, value):
+        with self._lock:
+            self._entries[key] = (value, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                evicted_key, _ = self._entries.popitem(last=False)
+                self._key_locks.pop(evicted_key, None)
+                for loop_locks in self._async_key_locks.values():
+                    loop_locks.pop(evicted_key, None)
+
+    def lock_for(self, key: str) -> threading.Lock:
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def async_lock_for(self, key: str) -> asyncio.Lock:
+        with self._lock:
+            loop_locks = self._async_key_locks.setdefault(asyncio.get_running_loop(), {})
+            return loop_locks.setdefault(key, asyncio.Lock())
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._key_locks.clear()
+            self._async_key_locks.clear()
+
+
+class SemanticPromptCache:
+    """
+    In-memory cache of LLM results keyed by the embedding of the query text.
+
+    A lookup returns the cached value of the most similar stored query when its
+    cosine similarity is at least `threshold`. Entries expire after `ttl`
+    seconds and are ignored once `template_version` changes, so edits to the
+    prompt invalidate plans produced by the old prompt.
+
+    A hit returns the stored value verbatim, so only store values that are valid
+    for any paraphrase of the query, e.g. tool plans without query-derived arguments.
+    """
+
+    def __init__(self, threshold: float = 0.92, ttl: int = 7 * 24 * 3600, template_version: str = "v1", max_entries: int = 1024):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.template_version = template_version
+        self.max_entries = max_entries
+        self._vectors = []
+        self._entries = []  # (value, timestamp, template_version)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, embedding):
+        """
+        Returns the cached value for the closest matching query, or None on a miss.
+        """
+        query = self._normalize(embedding)
+        now = time.time()
+        with self._lock:
+            self._evict_expired(now)
+            if not self._vectors:
+                return None
+            scores = np.stack(self._vectors) @ query
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                return None
+            value, _, _ = self._entries[best]
+            return value
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def update(self, embedding, value):
+        with self._lock:
+            if len(self._vectors) >= self.max_entries:
+                self._vectors.pop(0)
+                self._entries.pop(0)
+            self._vectors.append(self._normalize(embedding))
+            self._entries.append((value, time.time(), self.template_version))
+
+    def clear(self):
+        with self._lock:
+            self._vectors.clear()
+            self._entries.clear()
+
+    def _evict_expired(self, now: float):
+        keep = [
+            i for i, (_, ts, version) in enumerate(self._entries)
+            if now - ts < self.ttl and version == self.template_version
+        ]
+        if len(keep) != len(self._entries):
+            self._vectors = [self._vectors[i] for i in keep]
+            self._entries = [self._entries[i] for i in keep]
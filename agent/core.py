@@ -1,17 +1,99 @@
 import os
+import re
 import json
+import logging
+import functools
+import threading
+import orjson
 import google.generativeai as genai
+from agent.cache import ExactPromptCache, SemanticPromptCache
+from agent.plan_cache import PlanCache
+
+MODEL_NAME = "gemini-2.5-flash-lite-preview-06-17"
+EMBEDDING_MODEL = "models/text-embedding-004"
+# Bump whenever PROMPT_TEMPLATE changes so cached plans from the old prompt are dropped.
+PROMPT_TEMPLATE_VERSION = "v2"
+# One search extracts the plan object: the JSON inside a markdown code fence
+# if there is one, otherwise everything from the first '{' to the last '}'.
+_PLAN_RE = re.compile(r'```(?:json)?\s*(\{.*?\})\s*```|(\{.*\})', re.DOTALL)
+_JSON_ARRAY_RE = re.compile(r'\[.*\]', re.DOTALL)
+
+# This is a simplified tool description. In a real application, you would
+# dynamically generate this from the available tools.
+TOOL_DESCRIPTION = """
+        {
+            "tool_name": "get_portfolio_summary",
+            "description": "Analyzes the portfolio for a given time period and returns a summary.",
+            "parameters": {
+                "time_period": {
+                    "type": "str",
+                    "description": "The time period to analyze (e.g., 'last month')."
+                }
+            }
+        }
+        """
+
+# Everything except the user query is static, so the tool description is baked in once at import.
+PROMPT_TEMPLATE = """
+        You are an AI agent that helps users analyze their stock portfolio.
+        Based on the user's query, choose the best tool to use and return the tool name and parameters as a JSON object.
+
+        User Query: "{user_query}"
+
+        Available Tools:
+        """ + TOOL_DESCRIPTION.replace("{", "{{").replace("}", "}}") + """
+
+        Also write a short "summary_template" that presents the tool output to the user in natural language.
+        Use the placeholder {{result}} where the tool output should appear.
+
+        Respond with a JSON object in the following format:
+        {{
+            "tool_name": "<tool_name>",
+            "parameters": {{
+                "<parameter_name>": "<parameter_value>"
+            }},
+            "summary_template": "<summary_template>"
+        }}
+        """
+
+@functools.lru_cache(maxsize=1)
+def _shared_llm(model_name: str):
+    """
+    Configures genai and builds the model once per process, so every Agent
+    (one per AgentManager) reuses the same client and its connections.
+    """
+    api_key = os.environ.get("GEMINI_API_KEY")
+    if not api_key:
+        raise ValueError("GEMINI_API_KEY environment variable not set.")
+    genai.configure(api_key=api_key)
+    return genai.GenerativeModel(model_name)
+
+@functools.lru_cache(maxsize=1)
+def _warm_up(model_name: str):
+    """
+    Pays the TLS handshake and model cold start off the hot path with a one-token
+    call. Cached, so the billed ping is sent once per process, not once per Agent.
+    """
+    def ping():
+        try:
+            _shared_llm(model_name).generate_content("ping", generation_config={"max_output_tokens": 1})
+        except Exception as e:
+            logging.debug(f"LLM warmup call failed: {e}")
+
+    threading.Thread(target=ping, daemon=True).start()
 
 class Agent:
-    def __init__(self):
+    def __init__(self, warmup: bool = True):
         self.llm = self._setup_llm()
+        self._prompt_template = PROMPT_TEMPLATE
+        self.exact_cache = ExactPromptCache()
+        self.plan_cache = SemanticPromptCache(template_version=PROMPT_TEMPLATE_VERSION)
+        self.disk_cache = PlanCache.from_env()
+        if warmup:
+            _warm_up(MODEL_NAME)
 
     def _setup_llm(self):
-        api_key = os.environ.get("GEMINI_API_KEY")
-        if not api_key:
-            raise ValueError("GEMINI_API_KEY environment variable not set.")
-        genai.configure(api_key=api_key)
-        return genai.GenerativeModel('gemini-2.5-flash-lite-preview-06-17')
+        return _shared_llm(MODEL_NAME)
 
     def run(self, user_query: str) -> dict:
         """
@@ -24,28 +106,179 @@ class Agent:
             dict: The tool call plan from the LLM.
         """
         prompt = self._construct_prompt(user_query)
+        key = ExactPromptCache.make_key(MODEL_NAME, prompt)
+        plan = self.exact_cache.get(key)
+        if plan is not None:
+            return plan
+
+        with self.exact_cache.lock_for(key):
+            plan = self._cached_plan(prompt, key)
+            if plan is not None:
+                return plan
+
+            # Only embed when the embedding can be used: to look up a stored plan, or to store this one
+            embedding = self._embed(user_query) if len(self.plan_cache) else None
+            plan = self.plan_cache.lookup(embedding) if embedding is not None else None
+            if plan is None:
+                response = self.llm.generate_content(prompt)
+                #print(f"LLM Raw Response: {response.text}")
+                plan = self._parse_plan(response.text)
+                if embedding is None and self._semantic_cacheable(plan):
+                    embedding = self._embed(user_query)
+            self._store_plan(prompt, key, embedding, plan)
+            return plan
+
+    async def run_async(self, user_query: str) -> dict:
+        """
+        Async variant of `run` so several queries can await Gemini concurrently.
+
+        Args:
+            user_query (str): The user's query.
+
+        Returns:
+            dict: The tool call plan from the LLM.
+        """
+        prompt = self._construct_prompt(user_query)
+        key = ExactPromptCache.make_key(MODEL_NAME, prompt)
+        plan = self.exact_cache.get(key)
+        if plan is not None:
+            return plan
+
+        async with self.exact_cache.async_lock_for(key):
+            plan = self._cached_plan(prompt, key)
+            if plan is not None:
+                return plan
+
+            embedding = await self._embed_async(user_query) if len(self.plan_cache) else None
+            plan = self.plan_cache.lookup(embedding) if embedding is not None else None
+            if plan is None:
+                response = await self.llm.generate_content_async(prompt)
+                plan = self._parse_plan(response.text)
+                if embedding is None and self._semantic_cacheable(plan):
+                    embedding = await self._embed_async(user_query)
+            self._store_plan(prompt, key, embedding, plan)
+            return plan
+
+    def _cached_plan(self, prompt: str, key: str):
+        # In-process first, then the on-disk cache shared across restarts
+        plan = self.exact_cache.get(key)
+        if plan is None and self.disk_cache is not None:
+            plan = self.disk_cache.get(PlanCache.make_key(MODEL_NAME, prompt))
+            if plan is not None:
+                self.exact_cache.put(key, plan)
+        return plan
+
+    def _store_plan(self, prompt: str, key: str, embedding: list, plan: dict):
+        # Error plans are never cached so a retry gets a fresh LLM call.
+        if plan.get("error"):
+            return
+        self.exact_cache.put(key, plan)
+        if embedding is not None and self._semantic_cacheable(plan):
+            self.plan_cache.update(embedding, plan)
+        if self.disk_cache is not None:
+            self.disk_cache.put(PlanCache.make_key(MODEL_NAME, prompt), plan)
+
+    @staticmethod
+    def _semantic_cacheable(plan: dict) -> bool:
+        # A paraphrase may ask for another symbol or period, so only plans whose
+        # arguments don't depend on the query are shared by similarity
+        return not plan.get("error") and not plan.get("parameters")
+
+    def run_batch(self, user_queries: list[str]) -> list[dict]:
+        """
+        Plans several user queries with a single LLM call.
+
+        Args:
+            user_queries (list[str]): The user's queries.
+
+        Returns:
+            list[dict]: One tool call plan per query, in the same order.
+        """
+        prompts = [self._construct_prompt(q) for q in user_queries]
+        keys = [ExactPromptCache.make_key(MODEL_NAME, p) for p in prompts]
+        plans = [self._cached_plan(p, key) for p, key in zip(prompts, keys)]
+        pending = [i for i, plan in enumerate(plans) if plan is None]
+        if not pending:
+            return plans
+
+        prompt = self._construct_batch_prompt([user_queries[i] for i in pending])
         response = self.llm.generate_content(prompt)
-        #print(f"LLM Raw Response: {response.text}")
+        batch = self.parse_json_array(response.text, len(pending))
+        if batch is None:
+            error = {"error": "Invalid JSON response from LLM", "raw_response": response.text}
+            batch = [error] * len(pending)
+
+        for i, plan in zip(pending, batch):
+            if not isinstance(plan, dict):
+                plan = {"error": "Invalid plan returned by LLM", "raw_response": response.text}
+            elif not plan.get("error"):
+                self.exact_cache.put(keys[i], plan)
+                if self.disk_cache is not None:
+                    self.disk_cache.put(PlanCache.make_key(MODEL_NAME, prompts[i]), plan)
+            plans[i] = plan
+        return plans
+
+    @staticmethod
+    def parse_json_array(response_text: str, expected_length: int):
+        """
+        Extracts a JSON array of exactly `expected_length` items from the raw LLM
+        response text. Returns None if no such array can be parsed.
+        """
+        match = _JSON_ARRAY_RE.search(response_text or "")
+        if not match:
+            return None
+        try:
+            items = orjson.loads(match.group(0))
+        except orjson.JSONDecodeError:
+            return None
+        if not isinstance(items, list) or len(items) != expected_length:
+            return None
+        return items
+
+    def _embed(self, text: str):
+        """
+        Returns the query embedding, or None when the embedding call fails so the
+        query is still planned by the LLM, just without the semantic cache.
+        """
+        try:
+            return genai.embed_content(model=EMBEDDING_MODEL, content=text, task_type="semantic_similarity")["embedding"]
+        except Exception as e:
+            logging.warning(f"Embedding failed, skipping semantic plan cache: {e}")
+            return None
+
+    async def _embed_async(self, text: str):
+        try:
+            result = await genai.embed_content_async(model=EMBEDDING_MODEL, content=text, task_type="semantic_similarity")
+            return result["embedding"]
+        except Exception as e:
+            logging.warning(f"Embedding failed, skipping semantic plan cache: {e}")
+            return None
+
+    def _parse_plan(self, response_text: str) -> dict:
+        """
+        Extracts the JSON tool call plan from the raw LLM response text.
+
+        Args:
+            response_text (str): The raw text returned by the LLM.
 
+        Returns:
+            dict: The parsed plan, or an error dict if it is not valid JSON.
+        """
         try:
-            json_text = response.text
-            # Handle markdown code blocks
-            if '```json' in json_text:
-                json_text = json_text.split('```json')[1].split('```')[0]
-            elif '```' in json_text:
-                json_text = json_text.split('```')[1].split('```')[0]
-
-            # Find the first '{' and the last '}' to extract the JSON object
-            start = json_text.find('{')
-            end = json_text.rfind('}') + 1
-            if start != -1 and end != 0:
-                json_text = json_text[start:end]
-
-            plan = json.loads(json_text)
+            match = _PLAN_RE.search(response_text)
+            json_text = (match.group(1) or match.group(2)) if match else response_text
+
+            try:
+                plan = orjson.loads(json_text)
+            except orjson.JSONDecodeError:
+                # The stdlib parser accepts a few non-standard literals (NaN, Infinity) that orjson rejects
+                plan = json.loads(json_text)
+            if not isinstance(plan, dict):
+                raise TypeError(f"expected a JSON object, got {type(plan).__name__}")
             return plan
-        except (json.JSONDecodeError, TypeError, IndexError):
+        except (json.JSONDecodeError, TypeError):
             # Handle cases where the LLM doesn't return valid JSON
-            return {"error": "Invalid JSON response from LLM", "raw_response": response.text}
+            return {"error": "Invalid JSON response from LLM", "raw_response": response_text}
 
     def _construct_prompt(self, user_query: str) -> str:
         """
@@ -57,36 +290,40 @@ class Agent:
         Returns:
             str: The prompt for the LLM.
         """
-        # This is a simplified tool description. In a real application, you would
-        # dynamically generate this from the available tools.
-        tool_description = """
-        {
-            "tool_name": "get_portfolio_summary",
-            "description": "Analyzes the portfolio for a given time period and returns a summary.",
-            "parameters": {
-                "time_period": {
-                    "type": "str",
-                    "description": "The time period to analyze (e.g., 'last month')."
-                }
-            }
-        }
+        return self._prompt_template.format(user_query=user_query)
+
+    def _construct_batch_prompt(self, user_queries: list[str]) -> str:
+        """
+        Constructs a single prompt asking the LLM to plan every query in `user_queries`.
+
+        Args:
+            user_queries (list[str]): The user's queries.
+
+        Returns:
+            str: The prompt for the LLM.
         """
+        numbered_queries = "\n".join(f'        {i}. "{q}"' for i, q in enumerate(user_queries, start=1))
 
         prompt = f"""
         You are an AI agent that helps users analyze their stock portfolio.
-        Based on the user's query, choose the best tool to use and return the tool name and parameters as a JSON object.
+        For each numbered user query below, choose the best tool to use and return the tool name and parameters.
 
-        User Query: "{user_query}"
+        User Queries:
+{numbered_queries}
 
         Available Tools:
-        {tool_description}
+        {TOOL_DESCRIPTION}
 
-        Respond with a JSON object in the following format:
+        For each query also write a short "summary_template" that presents the tool output to the user in natural language.
+        Use the placeholder {{result}} where the tool output should appear.
+
+        Respond with a JSON array containing exactly {len(user_queries)} objects, one per query and in the same order, each in the following format:
         {{
             "tool_name": "<tool_name>",
             "parameters": {{
                 "<parameter_name>": "<parameter_value>"
-            }}
+            }},
+            "summary_template": "<summary_template>"
         }}
         """
-        return prompt
\ No newline at end of file
+        return prompt
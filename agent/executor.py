@@ -1,3 +1,8 @@
+import inspect
+
+_NO_TOOL_ERR = "No tool name provided in the plan."
+_TOOL_NOT_FOUND_ERR = "Tool '{name}' not found."
+_TOOL_ERR = "Error executing tool '{name}': {detail}"
 
 def execute_plan(plan: dict, tool_registry):
     """
@@ -8,21 +13,32 @@ def execute_plan(plan: dict, tool_registry):
         tool_registry: An instance of ToolRegistry.
 
     Returns:
-        The result of the tool call.
+        The result of the tool call. Failures are returned as an error dict
+        whose "error" template is filled in by `format_error` at display time;
+        unexpected exceptions raised by the tool propagate to the caller.
     """
     tool_name = plan.get("tool_name")
     parameters = plan.get("parameters", {})
 
     if not tool_name:
-        return {"error": "No tool name provided in the plan."}
+        return {"error": _NO_TOOL_ERR}
+
+    try:
+        tool_function = tool_registry.get_tools()[tool_name]
+    except (KeyError, TypeError):
+        return {"error": _TOOL_NOT_FOUND_ERR, "name": tool_name}
 
     try:
-        tools = tool_registry.get_tools()
-        if tool_name not in tools:
-            return {"error": f"Tool '{tool_name}' not found."}
-        
-        tool_function = tools[tool_name]
-        result = tool_function(**parameters)
-        return result
-    except Exception as e:
-        return {"error": f"Error executing tool '{tool_name}': {e}"}
+        # Check the LLM's parameters against the tool's signature before calling it, so
+        # a TypeError raised inside the tool isn't mistaken for a parameter mismatch
+        inspect.signature(tool_function).bind(**parameters)
+    except TypeError as e:
+        return {"error": _TOOL_ERR, "name": tool_name, "detail": str(e)}
+
+    return tool_function(**parameters)
+
+def format_error(result: dict) -> str:
+    """
+    Renders the error dict returned by `execute_plan` as a message.
+    """
+    return result["error"].format_map(result)
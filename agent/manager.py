@@ -1,11 +1,19 @@
+import asyncio
+import string
 from agent.core import Agent
-from agent.executor import execute_plan
+from agent.executor import execute_plan, format_error
 from agent.tools import ToolRegistry
 
+# Max number of queries allowed to hit Gemini at the same time in ask_many.
+DEFAULT_RATE_LIMIT = 8
+# Max number of queries marshaled into a single prompt by ask_batch.
+MARSHAL_BATCH_SIZE = 8
+
 class AgentManager:
-    def __init__(self, broker):
+    def __init__(self, broker, rate_limit: int = DEFAULT_RATE_LIMIT):
         self.agent = Agent()
         self.tool_registry = ToolRegistry(broker)
+        self.rate_limit = rate_limit
 
     def ask(self, user_query: str) -> str:
         """
@@ -16,19 +24,182 @@ class AgentManager:
             if plan.get("error"):
                 return f"❌ Error from AI: {plan['error']}"
 
-            # The executor will now get tools from the registry
             result = execute_plan(plan, self.tool_registry)
             if isinstance(result, dict) and result.get("error"):
-                return f"❌ Error executing plan: {result['error']}"
+                return f"❌ Error executing plan: {format_error(result)}"
+
+            summary = self._render_summary(plan, result)
+            if summary is not None:
+                return f"\n🤖 AI Analyst:\n{summary}"
+
+            summary_response = self.agent.llm.generate_content(self._summary_prompt(result))
+            return f"\n🤖 AI Analyst:\n{summary_response.text}"
+
+        except Exception as e:
+            return f"❌ An unexpected error occurred: {e}"
+
+    def ask_stream(self, user_query: str):
+        """
+        Like `ask`, but yields the summary as Gemini produces it so the first
+        words reach the user before the whole response is generated.
+        """
+        try:
+            plan = self.agent.run(user_query)
+            if plan.get("error"):
+                yield f"❌ Error from AI: {plan['error']}"
+                return
+
+            result = execute_plan(plan, self.tool_registry)
+            if isinstance(result, dict) and result.get("error"):
+                yield f"❌ Error executing plan: {format_error(result)}"
+                return
+
+            summary = self._render_summary(plan, result)
+            if summary is not None:
+                yield f"\n🤖 AI Analyst:\n{summary}"
+                return
+
+            summary_response = self.agent.llm.generate_content(self._summary_prompt(result), stream=True)
+            yield "\n🤖 AI Analyst:\n"
+            for chunk in summary_response:
+                yield chunk.text
+
+        except Exception as e:
+            yield f"❌ An unexpected error occurred: {e}"
+
+    async def ask_async(self, user_query: str) -> str:
+        """
+        Async variant of `ask`. Tool execution runs in a worker thread so the
+        event loop stays free for other in-flight queries.
+        """
+        try:
+            plan = await self.agent.run_async(user_query)
+            if plan.get("error"):
+                return f"❌ Error from AI: {plan['error']}"
+
+            # The executor will now get tools from the registry
+            result = await asyncio.to_thread(execute_plan, plan, self.tool_registry)
+            if isinstance(result, dict) and result.get("error"):
+                return f"❌ Error executing plan: {format_error(result)}"
+
+            summary = self._render_summary(plan, result)
+            if summary is not None:
+                return f"\n🤖 AI Analyst:\n{summary}"
 
             # Pass the result back to the LLM for a natural language summary
-            summary_prompt = f'''
+            summary_response = await self.agent.llm.generate_content_async(self._summary_prompt(result))
+            return f"\n🤖 AI Analyst:\n{summary_response.text}"
+
+        except Exception as e:
+            return f"❌ An unexpected error occurred: {e}"
+
+    def ask_many(self, queries: list[str]) -> list[str]:
+        """
+        Answers several queries concurrently, with at most `rate_limit` of
+        them talking to Gemini at once. Responses keep the order of `queries`.
+        """
+        return asyncio.run(self._ask_many_async(queries))
+
+    async def _ask_many_async(self, queries: list[str]) -> list[str]:
+        semaphore = asyncio.Semaphore(self.rate_limit)
+
+        async def bounded_ask(query):
+            async with semaphore:
+                return await self.ask_async(query)
+
+        return await asyncio.gather(*(bounded_ask(q) for q in queries))
+
+    def ask_batch(self, queries: list[str]) -> list[str]:
+        """
+        Answers several queries by packing up to MARSHAL_BATCH_SIZE of them into
+        one planning prompt and one summary prompt. Responses keep the order of `queries`.
+        """
+        if len(queries) == 1:
+            return [self.ask(queries[0])]
+
+        responses = []
+        for i in range(0, len(queries), MARSHAL_BATCH_SIZE):
+            responses.extend(self._ask_marshaled(queries[i:i + MARSHAL_BATCH_SIZE]))
+        return responses
+
+    def _ask_marshaled(self, queries: list[str]) -> list[str]:
+        try:
+            plans = self.agent.run_batch(queries)
+            responses = [None] * len(queries)
+            results = {}
+            for idx, plan in enumerate(plans):
+                if plan.get("error"):
+                    responses[idx] = f"❌ Error from AI: {plan['error']}"
+                    continue
+
+                try:
+                    result = execute_plan(plan, self.tool_registry)
+                except Exception as e:
+                    # Keep one failing tool from sinking the rest of the batch
+                    responses[idx] = f"❌ An unexpected error occurred: {e}"
+                    continue
+                if isinstance(result, dict) and result.get("error"):
+                    responses[idx] = f"❌ Error executing plan: {format_error(result)}"
+                    continue
+
+                summary = self._render_summary(plan, result)
+                if summary is not None:
+                    responses[idx] = f"\n🤖 AI Analyst:\n{summary}"
+                else:
+                    results[idx] = result
+
+            if results:
+                summaries = self._summarize_batch(list(results.values()))
+                for idx, summary in zip(results, summaries):
+                    responses[idx] = f"\n🤖 AI Analyst:\n{summary}"
+            return responses
+
+        except Exception as e:
+            return [f"❌ An unexpected error occurred: {e}"] * len(queries)
+
+    def _summarize_batch(self, results: list) -> list[str]:
+        if len(results) == 1:
+            return [self.agent.llm.generate_content(self._summary_prompt(results[0])).text]
+
+        numbered_data = "\n".join(f"            {i}. {result}" for i, result in enumerate(results, start=1))
+        summary_prompt = f'''
+            For each numbered data item below, provide a natural language summary.
+            Respond with a JSON array of exactly {len(results)} strings, one per item and in the same order.
+
+{numbered_data}
+            '''
+        summary_response = self.agent.llm.generate_content(summary_prompt)
+        summaries = self.agent.parse_json_array(summary_response.text, len(results))
+        if summaries is None:
+            # Fall back to one call per item rather than mis-attributing summaries
+            return [self.agent.llm.generate_content(self._summary_prompt(r)).text for r in results]
+        return [str(s) for s in summaries]
+
+    @staticmethod
+    def _render_summary(plan: dict, result):
+        """
+        Fills the plan's `summary_template` with the tool result locally, saving
+        the summary round trip to the LLM. Returns None when the plan has no
+        usable template, in which case the caller asks the LLM instead.
+        """
+        template = plan.get("summary_template")
+        if not isinstance(template, str) or "{result}" not in template:
+            return None
+        fields = dict(result) if isinstance(result, dict) else {}
+        fields["result"] = result
+        try:
+            # The template comes from the LLM: only allow bare field names, never attribute or index lookups
+            for _, field_name, _, _ in string.Formatter().parse(template):
+                if field_name is not None and not field_name.isidentifier():
+                    return None
+            return template.format_map(fields)
+        except (KeyError, IndexError, ValueError, AttributeError):
+            return None
+
+    @staticmethod
+    def _summary_prompt(result) -> str:
+        return f'''
             Based on the following data, provide a natural language summary:
 
             Data: {result}
             '''
-            summary_response = self.agent.llm.generate_content(summary_prompt)
-            return f"\n🤖 AI Analyst:\n{summary_response.text}"
-
-        except Exception as e:
-            return f"❌ An unexpected error occurred: {e}"
\ No newline at end of file
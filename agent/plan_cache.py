@@ -0,0 +1,82 @@
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+import orjson
+
+DEFAULT_PLAN_CACHE_PATH = "data/agent_plan_cache.sqlite3"
+DEFAULT_PLAN_CACHE_TTL = 7 * 24 * 3600
+
+class PlanCache:
+    """
+    SQLite-backed plan cache keyed by a hash of the model name and prompt.
+
+    Unlike the in-memory caches in agent.cache, entries survive process
+    restarts, so scheduled jobs re-running the same query skip the LLM.
+    """
+
+    def __init__(self, path: str = DEFAULT_PLAN_CACHE_PATH, ttl: int = DEFAULT_PLAN_CACHE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS plans (prompt_hash BLOB PRIMARY KEY, plan BLOB NOT NULL, ts INTEGER NOT NULL)"
+        )
+        self._conn.commit()
+
+    @classmethod
+    def from_env(cls):
+        """
+        Builds a cache from AGENT_PLAN_CACHE_PATH / AGENT_PLAN_CACHE_TTL.
+        Returns None (cache disabled) when AGENT_PLAN_CACHE_PATH is set to an empty string.
+        """
+        path = os.environ.get("AGENT_PLAN_CACHE_PATH", DEFAULT_PLAN_CACHE_PATH)
+        if not path:
+            return None
+        ttl = int(os.environ.get("AGENT_PLAN_CACHE_TTL", DEFAULT_PLAN_CACHE_TTL))
+        try:
+            return cls(path, ttl)
+        except sqlite3.Error as e:
+            logging.warning(f"Could not open agent plan cache at {path}: {e}")
+            return None
+
+    @staticmethod
+    def make_key(model_name: str, prompt: str) -> bytes:
+        return hashlib.blake2b((model_name + prompt).encode(), digest_size=16).digest()
+
+    def get(self, key: bytes):
+        try:
+            with self._lock:
+                row = self._conn.execute("SELECT plan, ts FROM plans WHERE prompt_hash = ?", (key,)).fetchone()
+        except sqlite3.Error as e:
+            logging.warning(f"Agent plan cache read failed: {e}")
+            return None
+        if row is None:
+            return None
+        plan, ts = row
+        if time.time() - ts >= self.ttl:
+            return None
+        return orjson.loads(plan)
+
+    def put(self, key: bytes, plan: dict):
+        try:
+            with self._lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO plans (prompt_hash, plan, ts) VALUES (?, ?, ?)",
+                    (key, orjson.dumps(plan), int(time.time()))
+                )
+                self._conn.commit()
+        except sqlite3.Error as e:
+            logging.warning(f"Agent plan cache write failed: {e}")
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM plans")
+            self._conn.commit()
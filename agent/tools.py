@@ -1,21 +1,94 @@
 
-import pandas as pd
+from types import MappingProxyType
+import numpy as np
 from core.holdings import HoldingsAnalyzer
 from core.session_manager import SessionManager
 from core.cmp import CMPManager
 
+try:
+    from numba import njit
+except ImportError:  # numba is optional; fall back to numpy reductions
+    njit = None
+
+# Below this many holdings a plain loop beats the cost of building numpy arrays.
+LARGE_PORTFOLIO_ROWS = 5000
+
+
+def _aggregate_rows(holdings):
+    """
+    Returns (total_pnl, total_invested, (best_symbol, best_pnl), (worst_symbol, worst_pnl))
+    in a single pass over the analyzed holdings.
+    """
+    total_pnl = 0.0
+    total_invested = 0.0
+    best = worst = None
+    for h in holdings:
+        pnl = h["P&L"]
+        total_pnl += pnl
+        total_invested += h["Invested"]
+        if best is None or pnl > best[1]:
+            best = (h["Symbol"], pnl)
+        if worst is None or pnl < worst[1]:
+            worst = (h["Symbol"], pnl)
+    return total_pnl, total_invested, best, worst
+
+
+def _pnl_kernel(pnl, invested):
+    # Sums both columns and tracks the best/worst P&L positions in one pass
+    total_pnl = 0.0
+    total_invested = 0.0
+    best = 0
+    worst = 0
+    for i in range(pnl.shape[0]):
+        total_pnl += pnl[i]
+        total_invested += invested[i]
+        if pnl[i] > pnl[best]:
+            best = i
+        if pnl[i] < pnl[worst]:
+            worst = i
+    return total_pnl, total_invested, best, worst
+
+
+if njit is not None:
+    _reduce_pnl = njit(cache=True, fastmath=True)(_pnl_kernel)
+else:
+    def _reduce_pnl(pnl, invested):
+        return np.add.reduce(pnl), np.add.reduce(invested), int(pnl.argmax()), int(pnl.argmin())
+
+
+def _aggregate_arrays(holdings):
+    """
+    Same as `_aggregate_rows`, for very large holdings lists. The numeric
+    reduction runs JIT-compiled when numba is installed.
+    """
+    # Only the two numeric columns become arrays; fromiter fills them without an intermediate list
+    count = len(holdings)
+    pnl = np.fromiter((h["P&L"] for h in holdings), dtype=np.float64, count=count)
+    invested = np.fromiter((h["Invested"] for h in holdings), dtype=np.float64, count=count)
+    total_pnl, total_invested, best_idx, worst_idx = _reduce_pnl(pnl, invested)
+    # Strings stay out of the numeric kernel and are resolved by position afterwards
+    return (
+        total_pnl,
+        total_invested,
+        (holdings[best_idx]["Symbol"], pnl[best_idx]),
+        (holdings[worst_idx]["Symbol"], pnl[worst_idx]),
+    )
+
+
 class ToolRegistry:
     def __init__(self, broker):
         self.broker = broker
         self.holdings_analyzer = HoldingsAnalyzer(broker.user_id, broker.broker_name)
         session_manager = SessionManager()
         self.cmp_manager = CMPManager(csv_path="data/Name-symbol-mapping.csv", broker=broker, session_manager=session_manager)
+        # Built once and exposed read-only; executors look tools up on every plan.
+        self._tools = MappingProxyType({
+            "get_portfolio_summary": self.get_portfolio_summary
+        })
 
 
     def get_tools(self):
-        return {
-            "get_portfolio_summary": self.get_portfolio_summary
-        }
+        return self._tools
 
     def get_portfolio_summary(self, time_period: str) -> str:
         """
@@ -36,27 +109,25 @@ class ToolRegistry:
         if not holdings:
             return "No holdings found."
 
-        df = pd.DataFrame(holdings)
-
         # Filter by time_period if necessary (this is a simplified example)
         # For a real implementation, you would parse the time_period string
-        # and filter the dataframe accordingly.
+        # and filter the holdings accordingly.
         if time_period == "last month":
             # Placeholder for actual date filtering logic
             pass
 
-        total_pnl = df["P&L"].sum()
-        total_invested = df["Invested"].sum()
+        if len(holdings) > LARGE_PORTFOLIO_ROWS:
+            total_pnl, total_invested, best, worst = _aggregate_arrays(holdings)
+        else:
+            total_pnl, total_invested, best, worst = _aggregate_rows(holdings)
         roi = (total_pnl / total_invested) * 100 if total_invested > 0 else 0
-        best_performer = df.loc[df["P&L"].idxmax()]
-        worst_performer = df.loc[df["P&L"].idxmin()]
 
         summary = f"""
         Portfolio Summary for {time_period}:
         - Total P&L: {total_pnl:.2f}
         - Total Invested: {total_invested:.2f}
         - ROI: {roi:.2f}%
-        - Best Performer: {best_performer['Symbol']} with P&L of {best_performer['P&L']:.2f}
-        - Worst Performer: {worst_performer['Symbol']} with P&L of {worst_performer['P&L']:.2f}
+        - Best Performer: {best[0]} with P&L of {best[1]:.2f}
+        - Worst Performer: {worst[0]} with P&L of {worst[1]:.2f}
         """
         return summary
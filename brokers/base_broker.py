@@ -37,9 +37,10 @@ class BaseBroker(ABC):
         pass
 
     @abstractmethod
-    def get_trades(self):
+    def get_trades(self, nrows=None, since_date=None):
         """
-        Retrieve the user's trades.
+        Retrieve the user's trades, optionally only those on or after
+        `since_date` and/or the last `nrows` of them.
         """
         pass
 
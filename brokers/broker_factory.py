@@ -1,5 +1,37 @@
-from .zerodha_broker import ZerodhaBroker
-from .upstox_broker import UpstoxBroker
+# Broker name (lowercase) -> constructor taking (user_id, config).
+# Broker modules are imported inside their constructor so only the SDK of the
+# broker actually in use gets loaded.
+_BROKERS = {}
+
+def register_broker(name):
+    """
+    Decorator that registers a broker constructor under `name`.
+    """
+    def decorator(constructor):
+        _BROKERS[name.lower()] = constructor
+        return constructor
+    return decorator
+
+@register_broker('zerodha')
+def _make_zerodha(user_id, config):
+    from .zerodha_broker import ZerodhaBroker
+    return ZerodhaBroker(
+        user_id=user_id,
+        api_key=config['api_key'],
+        access_token=config['access_token']
+    )
+
+@register_broker('upstox')
+def _make_upstox(user_id, config):
+    from .upstox_broker import UpstoxBroker
+    return UpstoxBroker(
+        user_id=user_id,
+        api_key=config['api_key'],
+        api_secret=config['api_secret'],
+        redirect_uri=config['redirect_uri'],
+        code=config.get('code'),
+        access_token=config.get('access_token')
+    )
 
 class BrokerFactory:
     """
@@ -11,20 +43,8 @@ class BrokerFactory:
         """
         Returns a broker instance based on the broker name.
         """
-        if broker_name.lower() == 'zerodha':
-            return ZerodhaBroker(
-                user_id=user_id,
-                api_key=config['api_key'],
-                access_token=config['access_token']
-            )
-        elif broker_name.lower() == 'upstox':
-            return UpstoxBroker(
-                user_id=user_id,
-                api_key=config['api_key'],
-                api_secret=config['api_secret'],
-                redirect_uri=config['redirect_uri'],
-                code=config.get('code'),
-                access_token=config.get('access_token')
-            )
-        else:
-            raise ValueError(f"Broker '{broker_name}' is not supported.")
\ No newline at end of file
+        try:
+            constructor = _BROKERS[broker_name.lower()]
+        except KeyError:
+            raise ValueError(f"Broker '{broker_name}' is not supported.") from None
+        return constructor(user_id, config)
@@ -1,20 +1,121 @@
 from .base_broker import BaseBroker
 import upstox_client
 from upstox_client.rest import ApiException
-from core.utils import read_csv, write_csv, get_symbol_from_isin
+from core.utils import read_csv, read_csv_cached, write_csv, get_isin_symbol_map, get_symbol_isin_map, select_recent_trades
 import os
 import requests
-import json
-import pandas as pd
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import re
+import weakref
+import operator
+import threading
+import orjson
 import logging
+import pandas as pd
 
 from datetime import datetime
+from types import MappingProxyType
+from concurrent.futures import ThreadPoolExecutor
+
+HISTORY_FETCH_WORKERS = 8
+# Transient Upstox failures on reads (e.g. paginated trade history) are retried with exponential backoff.
+# GTT mutations are never retried here: a resent PUT/DELETE may already have been applied, and
+# core.gtt_manage backs off on 429 for them.
+_HTTP_RETRY = Retry(
+    total=5, backoff_factor=0.3, status_forcelist=(429, 500, 502, 503, 504),
+    allowed_methods=frozenset({"GET"}), raise_on_status=False
+)
+
+# Attributes always present on upstox_client.HoldingsData, read in one attrgetter call per holding
+_HOLDING_FIELDS = (
+    'tradingsymbol', 'exchange', 'instrument_token', 'isin', 'product', 'quantity', 't1_quantity',
+    'collateral_quantity', 'collateral_type', 'average_price', 'last_price', 'close_price', 'pnl',
+    'day_change', 'day_change_percentage'
+)
+_HOLDING_GETTER = operator.attrgetter(*_HOLDING_FIELDS)
+# Zerodha-format fields the Upstox model doesn't define, with their defaults
+_OPTIONAL_HOLDING_FIELDS = (
+    ('price', 0), ('used_quantity', 0), ('realised_quantity', 0), ('authorised_quantity', 0),
+    ('authorised_date', None), ('opening_quantity', 0), ('discrepancy', False)
+)
+# Read-only placeholders shared by every holding; copy with dict() before modifying
+_EMPTY_AUTHORISATION = MappingProxyType({})
+_EMPTY_MTF = MappingProxyType({'quantity': 0, 'used_quantity': 0, 'average_price': 0, 'value': 0, 'initial_margin': 0})
+
+_US_PER_S = 1e6
+_PRODUCT_MAPPING = {'D': 'CNC', 'I': 'MIS'} # Add other mappings if needed
+_FMT_ISO = '%Y-%m-%dT%H:%M:%S'
+_FMT_SPACE = '%Y-%m-%d %H:%M:%S'
+# Drops a trailing 'Z' and everything from the fractional-seconds dot onward
+_DT_CLEAN = re.compile(r'\..*$|Z')
+
+def _dumps(payload):
+    # The session already sends Content-Type: application/json, so the body can be raw orjson bytes.
+    # OPT_SERIALIZE_NUMPY covers prices that arrive as numpy scalars from pandas.
+    return orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY)
+
+def _gtt_field(rule, gtt, key, default=None):
+    """
+    Reads `key` from a GTT's ENTRY rule, falling back to the GTT itself.
+    """
+    if key in rule:
+        return rule[key]
+    return gtt.get(key, default)
+
+def _format_ts_us(ts):
+    """
+    Formats an Upstox epoch timestamp in microseconds, or returns None if it is invalid.
+    """
+    if not isinstance(ts, int) or ts < 0:
+        return None
+    try:
+        return datetime.fromtimestamp(ts / _US_PER_S).strftime('%Y-%m-%d %H:%M:%S')
+    except (ValueError, TypeError, OSError):
+        return None
+
+def _format_time(date_obj):
+    if not date_obj or not isinstance(date_obj, datetime):
+        return None
+    return date_obj.strftime('%H:%M:%S')
+
+def _parse_timestamps(values):
+    """
+    Parses Upstox timestamp strings (ISO or space separated, optionally with a
+    trailing 'Z' and fractional seconds) into datetimes in one vectorized pass.
+    Empty values become None; unparseable ones are logged and returned as the
+    cleaned string.
+    """
+    if not values:
+        return []
+    raw = pd.Series(values, dtype=object)
+    cleaned = raw.str.replace(_DT_CLEAN, '', regex=True)
+    # Exact formats keep parsing in pandas' C parser; ISO is by far the most common, so try it first
+    parsed = pd.to_datetime(cleaned, format=_FMT_ISO, errors='coerce')
+    retry = parsed.isna() & cleaned.notna()
+    if retry.any():
+        parsed[retry] = pd.to_datetime(cleaned[retry], format=_FMT_SPACE, errors='coerce')
+
+    results = []
+    for value, clean, ts in zip(values, cleaned, parsed):
+        if not value:
+            results.append(None)
+        elif pd.isna(ts):
+            logging.warning(f"Could not parse datetime string '{clean}' with known formats.")
+            results.append(clean)
+        else:
+            results.append(ts.to_pydatetime())
+    return results
 
 class UpstoxBroker(BaseBroker):
     """
     Concrete implementation for Upstox broker using upstox-python-sdk v2.
     """
 
+    # access token -> ApiClient, shared across instances (see _get_shared_api_client)
+    _api_clients = weakref.WeakValueDictionary()
+    _api_clients_lock = threading.Lock()
+
     def __init__(self, user_id, api_key, api_secret, redirect_uri, code=None, access_token=None):
         super().__init__(user_id)
         self.broker_name = "upstox"
@@ -32,6 +133,16 @@ class UpstoxBroker(BaseBroker):
         self.PRODUCT_CNC = 'CNC'
         self.csv_path = "c:\\Users\\nairv1\\OneDrive - Pegasystems Inc\\code\\pycode\\data\\Name-symbol-mapping.csv"
 
+        # One pooled HTTP session for all REST calls so connections are kept alive
+        self._session = requests.Session()
+        self._session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=20, max_retries=_HTTP_RETRY))
+        self._session.headers.update({
+            'Content-Type': 'application/json',
+            'Accept': 'application/json'
+        })
+        if self.access_token:
+            self._session.headers['Authorization'] = f'Bearer {self.access_token}'
+
         # API clients will be initialized after login
         self.login_api = None
         self.order_api = None
@@ -41,14 +152,12 @@ class UpstoxBroker(BaseBroker):
 
     def _get_instrument_key(self, symbol, segment):
         try:
-            df = pd.read_csv(self.csv_path)
-            df.columns = [col.strip() for col in df.columns]
+            isin_map = get_symbol_isin_map(self.csv_path)
             symbol_clean = symbol.replace("-BE", "").strip().upper()
-            match = df[df['SYMBOL'].str.upper() == symbol_clean]
-            if not match.empty:
-                isin = match.iloc[0]['ISIN NUMBER']
-                if pd.notna(isin) and str(isin).strip():
-                    return f"{segment}|{isin.strip()}"
+            if symbol_clean in isin_map:
+                isin = isin_map[symbol_clean]
+                if isin:
+                    return f"{segment}|{isin}"
                 else:
                     logging.warning(f"Missing ISIN for {symbol_clean}")
             else:
@@ -57,6 +166,22 @@ class UpstoxBroker(BaseBroker):
             logging.error(f"Error reading CSV or extracting instrument key: {e}")
         return None
 
+    @classmethod
+    def _get_shared_api_client(cls, access_token):
+        """
+        Return the ApiClient for `access_token`, creating it on first use. Brokers
+        logged in with the same token share one client and its connection pool;
+        the client is dropped once no broker references it.
+        """
+        with cls._api_clients_lock:
+            api_client = cls._api_clients.get(access_token)
+            if api_client is None:
+                configuration = upstox_client.Configuration()
+                configuration.access_token = access_token
+                api_client = upstox_client.ApiClient(configuration)
+                cls._api_clients[access_token] = api_client
+            return api_client
+
     def login(self):
         """
         Authenticate and establish a session with the broker.
@@ -66,8 +191,9 @@ class UpstoxBroker(BaseBroker):
             if not self.access_token:
                 raise Exception("Upstox access token not available for login.")
 
-            self.configuration.access_token = self.access_token
-            api_client = upstox_client.ApiClient(self.configuration)
+            self._session.headers['Authorization'] = f'Bearer {self.access_token}'
+            api_client = self._get_shared_api_client(self.access_token)
+            self.configuration = api_client.configuration
 
             # Initialize the specific API clients
             self.login_api = upstox_client.LoginApi(api_client)
@@ -93,6 +219,8 @@ class UpstoxBroker(BaseBroker):
                 logging.debug("Successfully logged out from Upstox (token revoked).")
         except ApiException as e:
             logging.debug(f"Error logging out from Upstox: {e}")
+        finally:
+            self._session.close()
 
     def get_holdings(self):
         """
@@ -106,33 +234,12 @@ class UpstoxBroker(BaseBroker):
             #logging.debug(f"holdings_data: {holdings_data}")
             holdings = []
             for item in holdings_data:
-                holding_dict = {
-                    'tradingsymbol': getattr(item, 'tradingsymbol', None),
-                    'exchange': getattr(item, 'exchange', None),
-                    'instrument_token': getattr(item, 'instrument_token', None),
-                    'isin': getattr(item, 'isin', None),
-                    'product': getattr(item, 'product', None),
-                    'price': getattr(item, 'price', 0),
-                    'quantity': getattr(item, 'quantity', 0),
-                    'used_quantity': getattr(item, 'used_quantity', 0),
-                    't1_quantity': getattr(item, 't1_quantity', 0),
-                    'realised_quantity': getattr(item, 'realised_quantity', 0),
-                    'authorised_quantity': getattr(item, 'authorised_quantity', 0),
-                    'authorised_date': getattr(item, 'authorised_date', None),
-                    'authorisation': {},
-                    'opening_quantity': getattr(item, 'opening_quantity', 0),
-                    'short_quantity': 0,
-                    'collateral_quantity': getattr(item, 'collateral_quantity', 0),
-                    'collateral_type': getattr(item, 'collateral_type', ''),
-                    'discrepancy': getattr(item, 'discrepancy', False),
-                    'average_price': getattr(item, 'average_price', 0),
-                    'last_price': getattr(item, 'last_price', 0),
-                    'close_price': getattr(item, 'close_price', 0),
-                    'pnl': getattr(item, 'pnl', 0),
-                    'day_change': getattr(item, 'day_change', 0),
-                    'day_change_percentage': getattr(item, 'day_change_percentage', 0),
-                    'mtf': {'quantity': 0, 'used_quantity': 0, 'average_price': 0, 'value': 0, 'initial_margin': 0}
-                }
+                holding_dict = dict(zip(_HOLDING_FIELDS, _HOLDING_GETTER(item)))
+                for field, default in _OPTIONAL_HOLDING_FIELDS:
+                    holding_dict[field] = getattr(item, field, default)
+                holding_dict['authorisation'] = _EMPTY_AUTHORISATION
+                holding_dict['short_quantity'] = 0
+                holding_dict['mtf'] = _EMPTY_MTF
                 holdings.append(holding_dict)
             #logging.debug(f"Holdings: {holdings}")
             return holdings
@@ -140,13 +247,6 @@ class UpstoxBroker(BaseBroker):
             logging.debug(f"Error getting holdings from Upstox: {e}")
             return []
 
-    def _get_gtt_headers(self):
-        return {
-            'Authorization': f'Bearer {self.access_token}',
-            'Content-Type': 'application/json',
-            'Accept': 'application/json'
-        }
-
     def get_gtt_orders(self):
         """
         Retrieve the user's Good Till Triggered (GTT) orders.
@@ -154,8 +254,7 @@ class UpstoxBroker(BaseBroker):
         logging.debug("Getting GTT orders from Upstox")
         try:
             url = "https://api.upstox.com/v3/order/gtt"
-            headers = self._get_gtt_headers()
-            response = requests.get(url, headers=headers)
+            response = self._session.get(url)
             response.raise_for_status()
             gtc_data = response.json().get('data', [])
             #logging.debug(f"gtc_data: {gtc_data}")
@@ -163,53 +262,38 @@ class UpstoxBroker(BaseBroker):
             gtt_orders = []
             for g in gtc_data:
                 # Find the ENTRY rule and discard others
-                entry_rule = None
-                if 'rules' in g and isinstance(g['rules'], list):
-                    for rule in g['rules']:
-                        if rule.get('strategy') == 'ENTRY':
-                            entry_rule = rule
-                            break
+                entry_rule = next((r for r in g.get('rules') or () if r.get('strategy') == 'ENTRY'), None)
                 
                 # If no ENTRY rule is found, skip this record
                 if not entry_rule:
                     continue
 
-                # Combine original GTC data with the entry rule data
-                processed_data = g.copy()
-                processed_data.update(entry_rule)
+                trading_symbol = _gtt_field(entry_rule, g, 'trading_symbol')
+                trigger_price = _gtt_field(entry_rule, g, 'trigger_price')
 
                 # Format dates
-                def format_timestamp(ts):
-                    if not isinstance(ts, int) or ts < 0:
-                        return None
-                    try:
-                        # Assuming timestamp is in microseconds
-                        return datetime.fromtimestamp(ts / 1000000).strftime('%Y-%m-%d %H:%M:%S')
-                    except (ValueError, TypeError, OSError):
-                        return None
-
-                created_at = format_timestamp(processed_data.get('created_at'))
-                expires_at = format_timestamp(processed_data.get('expires_at'))
+                created_at = _format_ts_us(_gtt_field(entry_rule, g, 'created_at'))
+                expires_at = _format_ts_us(_gtt_field(entry_rule, g, 'expires_at'))
                 # The user's desired format has updated_at. Let's use created_at as a fallback.
-                updated_at = format_timestamp(processed_data.get('updated_at', processed_data.get('created_at')))
+                updated_at = _format_ts_us(_gtt_field(entry_rule, g, 'updated_at', _gtt_field(entry_rule, g, 'created_at')))
 
 
                 # Transform status
-                status = processed_data.get('status')
+                status = _gtt_field(entry_rule, g, 'status')
                 if status == 'SCHEDULED':
                     status = 'active'
 
                 # Trim _EQ from exchange
-                exchange = processed_data.get('exchange')
+                exchange = _gtt_field(entry_rule, g, 'exchange')
                 if exchange and exchange.endswith('_EQ'):
                     exchange = exchange[:-3]
 
                 # Build the final nested order dictionary
                 order = {
-                    'id': processed_data.get('gtt_order_id'),
+                    'id': _gtt_field(entry_rule, g, 'gtt_order_id'),
                     'user_id': self.user_id,
                     'parent_trigger': None,
-                    'type': processed_data.get('type', 'single'),
+                    'type': _gtt_field(entry_rule, g, 'type', 'single'),
                     'created_at': created_at,
                     'updated_at': updated_at,
                     'expires_at': expires_at,
@@ -217,18 +301,18 @@ class UpstoxBroker(BaseBroker):
                     'condition': {
                         'exchange': exchange,
                         'last_price': None,  # Not available from Upstox GTT list API
-                        'tradingsymbol': processed_data.get('trading_symbol'),
-                        'trigger_values': [processed_data.get('trigger_price')],
-                        'instrument_token': processed_data.get('instrument_token')
+                        'tradingsymbol': trading_symbol,
+                        'trigger_values': [trigger_price],
+                        'instrument_token': _gtt_field(entry_rule, g, 'instrument_token')
                     },
                     'orders': [{
                         'exchange': exchange,
-                        'tradingsymbol': processed_data.get('trading_symbol'),
+                        'tradingsymbol': trading_symbol,
                         'product': 'CNC',  # Assuming CNC, as product is not in Upstox GTT response
                         'order_type': 'LIMIT',  # Assuming LIMIT, as order_type is not in Upstox GTT response
-                        'transaction_type': processed_data.get('transaction_type'),
-                        'quantity': processed_data.get('quantity'),
-                        'price': processed_data.get('trigger_price'), # price is not in the root, but trigger_price is. Assuming this is what's wanted.
+                        'transaction_type': _gtt_field(entry_rule, g, 'transaction_type'),
+                        'quantity': _gtt_field(entry_rule, g, 'quantity'),
+                        'price': trigger_price, # price is not in the root, but trigger_price is. Assuming this is what's wanted.
                         'result': None
                     }],
                     'meta': {}
@@ -291,8 +375,7 @@ class UpstoxBroker(BaseBroker):
         #logging.debug(f"Placing GTT order in Upstox: {order_details}")
         try:
             url = "https://api.upstox.com/v3/order/gtt/place"
-            headers = self._get_gtt_headers()
-            response = requests.post(url, headers=headers, data=json.dumps(order_details))
+            response = self._session.post(url, data=_dumps(order_details))
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
@@ -308,8 +391,7 @@ class UpstoxBroker(BaseBroker):
         logging.debug(f"Modifying GTT in Upstox: {order_id}")
         try:
             url = f"https://api.upstox.com/v2/gtt/orders/{order_id}"
-            headers = self._get_gtt_headers()
-            response = requests.put(url, headers=headers, data=json.dumps(order_details))
+            response = self._session.put(url, data=_dumps(order_details))
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
@@ -323,24 +405,24 @@ class UpstoxBroker(BaseBroker):
         logging.debug(f"Cancelling GTT in Upstox: {order_id}")
         try:
             url = "https://api.upstox.com/v3/order/gtt/cancel"
-            headers = self._get_gtt_headers()
             payload = {'gtt_order_id': order_id}
-            response = requests.delete(url, headers=headers, data=json.dumps(payload))
+            response = self._session.delete(url, data=_dumps(payload))
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
             logging.debug(f"Error cancelling GTT in Upstox: {e}")
             raise
 
-    def get_trades(self):
+    def get_trades(self, nrows=None, since_date=None):
         """
-        Retrieve the user's trades from the trade book.
+        Retrieve the user's trades from the trade book, optionally only those
+        on or after `since_date` and/or the last `nrows` of them.
         """
         file_path = f"data/{self.user_id}_trade_book.csv"
         logging.debug(f"Getting trades from {file_path} for Upstox")
         if os.path.exists(file_path):
-            self._trades = read_csv(file_path)
-        return self._trades
+            self._trades = read_csv_cached(file_path)
+        return select_recent_trades(self._trades, nrows, since_date)
 
     def trades(self):
         """
@@ -351,43 +433,13 @@ class UpstoxBroker(BaseBroker):
         try:
             api_response = self.order_api.get_trade_history('v2')
             upstox_trades = api_response.data
-            formatted_trades = []
-            for trade in upstox_trades:
-                
-                def parse_datetime(date_str):
-                    if not date_str:
-                        return None
-                    
-                    # List of possible formats
-                    formats_to_try = [
-                        '%Y-%m-%dT%H:%M:%S',  # ISO format
-                        '%Y-%m-%d %H:%M:%S',  # Space separated
-                    ]
-
-                    # Pre-process string to handle variations
-                    date_str = date_str.replace('Z', '')
-                    if '.' in date_str:
-                        date_str = date_str.split('.')[0]
-
-                    for fmt in formats_to_try:
-                        try:
-                            return datetime.strptime(date_str, fmt)
-                        except (ValueError, TypeError):
-                            continue
-                    
-                    # If all formats fail, log a warning and return the original string
-                    logging.warning(f"Could not parse datetime string '{date_str}' with known formats.")
-                    return date_str
-
-                def format_time(date_obj):
-                     if not date_obj or not isinstance(date_obj, datetime):
-                        return None
-                     return date_obj.strftime('%H:%M:%S')
-
-                product_mapping = {'D': 'CNC', 'I': 'MIS'} # Add other mappings if needed
-                
-                order_timestamp_dt = parse_datetime(trade.order_timestamp)
 
+            # Parse each timestamp column in one vectorized pass instead of per-trade strptime
+            exchange_timestamps = _parse_timestamps([trade.exchange_timestamp for trade in upstox_trades])
+            order_timestamps = _parse_timestamps([trade.order_timestamp for trade in upstox_trades])
+
+            formatted_trades = []
+            for trade, exchange_ts, order_ts in zip(upstox_trades, exchange_timestamps, order_timestamps):
                 tradingsymbol = trade.tradingsymbol
                 instrument_token = trade.instrument_token
                 if instrument_token and instrument_token.startswith('NSE_EQ') and not tradingsymbol.endswith('-EQ'):
@@ -400,14 +452,14 @@ class UpstoxBroker(BaseBroker):
                     'exchange': trade.exchange,
                     'tradingsymbol': tradingsymbol,
                     'instrument_token': instrument_token,
-                    'product': product_mapping.get(trade.product, trade.product),
+                    'product': _PRODUCT_MAPPING.get(trade.product, trade.product),
                     'average_price': trade.average_price,
                     'quantity': trade.quantity,
                     'exchange_order_id': trade.exchange_order_id,
                     'transaction_type': trade.transaction_type,
-                    'fill_timestamp': parse_datetime(trade.exchange_timestamp),
-                    'order_timestamp': format_time(order_timestamp_dt),
-                    'exchange_timestamp': parse_datetime(trade.exchange_timestamp)
+                    'fill_timestamp': exchange_ts,
+                    'order_timestamp': _format_time(order_ts),
+                    'exchange_timestamp': exchange_ts
                 }
                 formatted_trades.append(formatted_trade)
             return formatted_trades
@@ -464,68 +516,84 @@ class UpstoxBroker(BaseBroker):
         logging.debug(f"Updating trade book for Upstox: {file_path}")
         write_csv(file_path, data)
 
+    def _fetch_historical_trades_page(self, start_date, end_date, page_number, page_size):
+        """
+        Fetch one page of historical trades. Returns the response JSON, or None on failure.
+        """
+        url = f"https://api.upstox.com/v2/charges/historical-trades?start_date={start_date}&end_date={end_date}&page_size={page_size}&page_number={page_number}"
+        try:
+            response = self._session.get(url)
+            response.raise_for_status()
+            data = response.json()
+        except requests.exceptions.RequestException as e:
+            logging.error(f"Error downloading historical trades from Upstox: {e}")
+            return None
+
+        if data.get('status') != 'success':
+            logging.error(f"Error from Upstox API: {data.get('errors')}")
+            return None
+        return data
+
     def download_historical_trades(self, start_date, end_date):
         """
         Download historical trades from Upstox API.
         """
         logging.debug(f"Downloading historical trades for user {self.user_id} from {start_date} to {end_date}")
-        all_trades = []
-        page_number = 1
         page_size = 500  # As per Upstox API docs, max page size is 500
 
-        headers = {
-            'Accept': 'application/json',
-            'Authorization': f'Bearer {self.access_token}'
-        }
+        first_page = self._fetch_historical_trades_page(start_date, end_date, 1, page_size)
+        all_trades = []
+        if first_page and first_page.get('data'):
+            all_trades.extend(first_page['data'])
+            total_pages = first_page.get('meta_data', {}).get('page', {}).get('total_pages', 1)
+
+            # Once the page count is known the remaining pages are independent, so fetch them concurrently
+            if total_pages > 1:
+                executor = ThreadPoolExecutor(max_workers=HISTORY_FETCH_WORKERS)
+                futures = [
+                    executor.submit(self._fetch_historical_trades_page, start_date, end_date, n, page_size)
+                    for n in range(2, total_pages + 1)
+                ]
+                try:
+                    for page_number, future in enumerate(futures, start=2):
+                        page = future.result()
+                        # Stop at the first failed or empty page, as the sequential loop did
+                        if not page or not page.get('data'):
+                            if page is None:
+                                logging.warning(f"Returning {len(all_trades)} trades fetched before page {page_number} of {total_pages} failed")
+                            break
+                        all_trades.extend(page['data'])
+                finally:
+                    # After a failure or exception, pages that haven't started are never fetched
+                    executor.shutdown(wait=True, cancel_futures=True)
 
-        while True:
-            url = f"https://api.upstox.com/v2/charges/historical-trades?start_date={start_date}&end_date={end_date}&page_size={page_size}&page_number={page_number}"
-            
-            try:
-                response = requests.get(url, headers=headers)
-                response.raise_for_status()
-                data = response.json()
-
-                if data.get('status') != 'success':
-                    logging.error(f"Error from Upstox API: {data.get('errors')}")
-                    break
-
-                trades = data.get('data', [])
-                if not trades:
-                    break
-
-                all_trades.extend(trades)
-
-                meta_data = data.get('meta_data', {})
-                total_pages = meta_data.get('page', {}).get('total_pages', 1)
-
-                if page_number >= total_pages:
-                    break
-
-                page_number += 1
-
-            except requests.exceptions.RequestException as e:
-                logging.error(f"Error downloading historical trades from Upstox: {e}")
-                break
-        
-        # Transform data
-        transformed_trades = []
-        for trade in all_trades:
-            transformed_trade = {
-                'symbol': get_symbol_from_isin(trade.get('isin')),
-                'isin': trade.get('isin'),
-                'trade_date': trade.get('trade_date'),
-                'exchange': trade.get('exchange'),
-                'segment': trade.get('segment'),
-                'series': trade.get('segment'),  # As per user mapping
-                'trade_type': trade.get('transaction_type'),
-                'auction': 'FALSE',
-                'quantity': trade.get('quantity'),
-                'price': trade.get('price'),
-                'trade_id': trade.get('trade_id'),
-                'order_id': 'NA',
-                'order_execution_time': 'NA'
-            }
-            transformed_trades.append(transformed_trade)
-        
-        return transformed_trades
+        if not all_trades:
+            return []
+
+        # Transform data column-wise, resolving symbols from one ISIN map lookup table
+        try:
+            isin_map = get_isin_symbol_map()
+        except Exception as e:
+            logging.error(f"Failed to load ISIN to symbol mapping: {e}")
+            isin_map = {}
+        df = pd.DataFrame(all_trades).reindex(columns=[
+            'isin', 'trade_date', 'exchange', 'segment', 'transaction_type', 'quantity', 'price', 'trade_id'
+        ])
+        transformed = pd.DataFrame({
+            'symbol': df['isin'].map(isin_map),
+            'isin': df['isin'],
+            'trade_date': df['trade_date'],
+            'exchange': df['exchange'],
+            'segment': df['segment'],
+            'series': df['segment'],  # As per user mapping
+            'trade_type': df['transaction_type'],
+            'auction': 'FALSE',
+            'quantity': df['quantity'],
+            'price': df['price'],
+            'trade_id': df['trade_id'],
+            'order_id': 'NA',
+            'order_execution_time': 'NA'
+        })
+        # Missing values come back as None, as they did from trade.get()
+        transformed = transformed.astype(object).where(transformed.notna(), None)
+        return transformed.to_dict('records')
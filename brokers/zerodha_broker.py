@@ -1,19 +1,24 @@
 from .base_broker import BaseBroker
 from kiteconnect import KiteConnect
-from core.utils import read_csv, write_csv
+from core.utils import read_csv, read_csv_cached, write_csv, select_recent_trades
 import os
 import logging
+import weakref
+import threading
 
 class ZerodhaBroker(BaseBroker):
     """
     Concrete implementation for Zerodha broker.
     """
 
+    # (api_key, access_token) -> KiteConnect, shared so re-initialised sessions reuse warm connections
+    _kite_clients = weakref.WeakValueDictionary()
+    _kite_clients_lock = threading.Lock()
+
     def __init__(self, user_id, api_key, access_token):
         super().__init__(user_id)
         self.broker_name = "zerodha"
-        self.kite = KiteConnect(api_key=api_key)
-        self.kite.set_access_token(access_token)
+        self.kite = self._get_shared_kite(api_key, access_token)
         self._trades = []
         # For compatibility with existing code that uses kite.TRANSACTION_TYPE_BUY
         self.TRANSACTION_TYPE_BUY = 'BUY'
@@ -24,20 +29,31 @@ class ZerodhaBroker(BaseBroker):
         self.PRODUCT_CNC = 'CNC'
 
 
+    @classmethod
+    def _get_shared_kite(cls, api_key, access_token):
+        """
+        Return the KiteConnect client for `api_key`/`access_token`, creating it on
+        first use. Brokers built with the same credentials share one client and
+        its connection pool; the client is dropped once no broker references it.
+        """
+        with cls._kite_clients_lock:
+            kite = cls._kite_clients.get((api_key, access_token))
+            if kite is None:
+                # KiteConnect keeps one requests.Session; give it a pool sized for back-to-back GTT calls
+                kite = KiteConnect(api_key=api_key, pool={"pool_connections": 4, "pool_maxsize": 20})
+                kite.set_access_token(access_token)
+                cls._kite_clients[(api_key, access_token)] = kite
+            return kite
+
     def login(self):
         """
         Authenticate and establish a session with the broker.
         """
         # In this implementation, we assume that the access token is already available.
         # You might need to implement the full login flow to get the access token.
+        # The token has already been validated by SessionManager (via kite.profile()) before the
+        # broker is built, so no extra round trip here; an expired token surfaces on the first API call.
         logging.debug(f"Logging in to Zerodha for user {self.user_id}")
-        try:
-            # Get user profile to verify the connection
-            profile = self.kite.profile()
-            logging.debug(f"Successfully logged in as {profile['user_name']}")
-        except Exception as e:
-            logging.debug(f"Error logging in to Zerodha: {e}")
-            raise
 
     def logout(self):
         """
@@ -75,16 +91,17 @@ class ZerodhaBroker(BaseBroker):
             logging.debug(f"Error getting GTT orders from Zerodha: {e}")
             return []
 
-    def get_trades(self):
+    def get_trades(self, nrows=None, since_date=None):
         """
-        Retrieve the user's trades from the trade book.
+        Retrieve the user's trades from the trade book, optionally only those
+        on or after `since_date` and/or the last `nrows` of them.
         """
         file_path = f"data/{self.user_id}_trade_book.csv"
         logging.debug(f"Getting trades from {file_path} for Zerodha")
         if os.path.exists(file_path):
-            self._trades = read_csv(file_path)
+            self._trades = read_csv_cached(file_path)
         logging.debug(f"Trades: {self._trades}")
-        return self._trades
+        return select_recent_trades(self._trades, nrows, since_date)
 
     def trades(self):
         """
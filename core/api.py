@@ -1,30 +1,172 @@
-from fastapi import FastAPI, Query, Request
-from fastapi.responses import JSONResponse
+import asyncio
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import FastAPI, Query, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.middleware.gzip import GZipMiddleware
+import os
+import logging
 import traceback
-import json
-import math
+import hashlib
+import bisect
+from functools import lru_cache
+from operator import itemgetter
+from types import MappingProxyType
+import orjson
 from pydantic import BaseModel
-from kiteconnect import KiteConnect
 
 from core.session_singleton import shared_session as session
 from core.entry import detect_duplicates, BaseEntryStrategy
 from core.multilevel_entry import MultiLevelEntryStrategy
+from core.dynamic_avg import DynamicAveragingPlanner
 from core.gtt_manage import GTTManager
-from core.holdings import HoldingsAnalyzer
+from core.holdings import HoldingsAnalyzer, format_trend
 from brokers.broker_factory import BrokerFactory
 
+_ORJSON_OPTS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+# Rows encoded per chunk by _stream_json
+STREAM_CHUNK_ROWS = 256
+
+class ORJSONResponse(JSONResponse):
+    """
+    JSONResponse rendered with orjson: faster than the stdlib encoder, emits NaN/inf
+    as null instead of failing, and serializes numpy values from pandas natively.
+    """
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, option=_ORJSON_OPTS)
+
+
+def _stream_json(fields: dict, list_key: str, rows: list, row_fn=None) -> StreamingResponse:
+    """
+    Streams `{**fields, list_key: rows}` as a JSON object, encoding STREAM_CHUNK_ROWS
+    rows at a time so large row lists are never held as a single encoded body.
+    `row_fn`, if given, is applied to each row as it is encoded.
+    """
+    def generate():
+        head = orjson.dumps(fields, option=_ORJSON_OPTS)[:-1]
+        yield head + (b',' if fields else b'') + orjson.dumps(list_key) + b':['
+        for start in range(0, len(rows), STREAM_CHUNK_ROWS):
+            chunk = rows[start:start + STREAM_CHUNK_ROWS]
+            if row_fn is not None:
+                chunk = map(row_fn, chunk)
+            yield (b',' if start else b'') + b','.join(orjson.dumps(row, option=_ORJSON_OPTS) for row in chunk)
+        yield b']}'
+    return StreamingResponse(generate(), media_type="application/json")
+
+# Workers in the executor behind asyncio.to_thread; every broker call, cache
+# refresh and CSV read in the handlers below runs there.
+API_THREAD_WORKERS = int(os.getenv("API_THREAD_WORKERS", "40"))
+
+@asynccontextmanager
+async def _lifespan(app: FastAPI):
+    executor = ThreadPoolExecutor(max_workers=API_THREAD_WORKERS, thread_name_prefix="api-worker")
+    asyncio.get_running_loop().set_default_executor(executor)
+    yield
+    executor.shutdown(wait=False)
+
 app = FastAPI(
     title="Equity Portfolio API",
     description="REST API for managing tradebook, GTT orders, and ROI analysis",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=_lifespan,
+    default_response_class=ORJSONResponse
 )
+# Holdings, plan and GTT lists compress well; small responses are sent as is
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=4)
+
+# Include tracebacks in 500 responses only when API_DEBUG is set
+API_DEBUG = os.getenv("API_DEBUG", "").lower() in ("1", "true", "yes")
+
+def _error_response(e: Exception, message: str = None) -> ORJSONResponse:
+    """
+    Builds the 500 response for an exception caught in a handler. Must be called
+    from inside the `except` block; the traceback is only formatted in debug mode.
+    """
+    body = {"error": message if message is not None else str(e)}
+    if API_DEBUG:
+        body["trace"] = traceback.format_exc()
+    logging.error(f"API request failed: {e!r}", exc_info=logging.getLogger().isEnabledFor(logging.DEBUG))
+    return ORJSONResponse(status_code=500, content=body)
+
+def _refreshed(force: bool, work, *args):
+    """
+    Refreshes the session caches, then returns `work(*args)`. Run it with
+    asyncio.to_thread so the refresh and the file I/O or hashing that follows
+    it share one worker thread and neither blocks the event loop.
+    """
+    session.refresh_all_caches(force=force)
+    return work(*args)
+
+def _not_modified(request: Request, response: Response, digest: str):
+    """
+    Sets an ETag derived from a `session.cache_digest` and the query string.
+    Returns a 304 response when the client already holds that version, else None.
+    """
+    key = f"{digest}?{request.url.query}"
+    etag = f'"{hashlib.blake2b(key.encode(), digest_size=8).hexdigest()}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return None
+
+# GTTManager.analyze_gtt_buy_orders returns orders sorted by this key, so
+# variance thresholds split the list with a binary search instead of a scan.
+_variance = itemgetter("Variance (%)")
+
+def _gtt_manager() -> GTTManager:
+    """
+    Returns the session's GTTManager. It keeps no per-request state, so one instance
+    is reused until the broker or CMP manager changes.
+    """
+    return session.get_gtt_manager()
+
+@lru_cache(maxsize=8)
+def _holdings_analyzer(user_id: str, broker_name: str) -> HoldingsAnalyzer:
+    """
+    Returns the HoldingsAnalyzer for a user and broker. It only holds file paths,
+    so one instance per account is shared across requests.
+    """
+    return HoldingsAnalyzer(user_id, broker_name)
+
+# (entry levels list, its duplicate symbols) for the most recently loaded entry levels
+_duplicates_cache = (None, [])
+
+def _entry_level_duplicates(entry_levels: list) -> list:
+    """
+    `detect_duplicates` for the session's entry levels, computed once per loaded
+    list rather than on every request; the session replaces the list on refresh.
+    """
+    global _duplicates_cache
+    source, duplicates = _duplicates_cache
+    if source is not entry_levels:
+        duplicates = detect_duplicates(entry_levels)
+        _duplicates_cache = (entry_levels, duplicates)
+    return list(duplicates)
+
+def _plan(identify_candidates, generate_plan) -> list:
+    """
+    Runs a planner end to end. Candidate selection and plan generation are both
+    executed in one worker thread, keeping the planning loop off the event loop.
+    """
+    return generate_plan(identify_candidates())
+
+def _buy_orders() -> tuple:
+    # The manager is looked up after the refresh, which may replace the CMP manager
+    manager = _gtt_manager()
+    return manager, manager.analyze_gtt_buy_orders()
+
+def _place_and_clear_plan(manager: GTTManager, orders: list) -> list:
+    placed_orders = manager.place_orders(orders, dry_run=False)
+    session.delete_gtt_plan()
+    return placed_orders
 
 class SessionInitRequest(BaseModel):
     broker_name: str
     user_id: str
 
 @app.post("/session/initialize")
-def initialize_session(request: SessionInitRequest):
+async def initialize_session(request: SessionInitRequest):
     try:
         session_manager = session.session_manager
         config = {}
@@ -35,23 +177,23 @@ def initialize_session(request: SessionInitRequest):
             config['api_key'] = session_manager.upstox_api_key
             config['api_secret'] = session_manager.upstox_api_secret
             config['redirect_uri'] = session_manager.upstox_redirect_uri
-            config['access_token'] = session_manager.get_valid_upstox_access_token()
+            config['access_token'] = await asyncio.to_thread(session_manager.get_valid_upstox_access_token)
         else: # default to zerodha
             broker_name = 'zerodha'
             config['api_key'] = session_manager.kite_api_key
-            config['access_token'] = session_manager.get_valid_kite_access_token()
+            config['access_token'] = await asyncio.to_thread(session_manager.get_valid_kite_access_token)
 
-        session.broker = BrokerFactory.get_broker(broker_name, user_id, config)
-        session.broker.login()
-        session.refresh_all_caches()
+        session.broker = await asyncio.to_thread(BrokerFactory.get_broker, broker_name, user_id, config)
+        await asyncio.to_thread(session.broker.login)
+        await asyncio.to_thread(session.refresh_all_caches, force=True)
 
         return {"message": f"Session initialized for {broker_name} with user_id {user_id}"}
     except Exception as e:
-        return JSONResponse(status_code=500, content={"error": str(e), "trace": traceback.format_exc()})
+        return _error_response(e)
 
 
 @app.get("/session/validate-tokens")
-def validate_tokens(broker_name: str = Query(..., description="The broker to check ('zerodha', 'upstox')")):
+async def validate_tokens(broker_name: str = Query(..., description="The broker to check ('zerodha', 'upstox')")):
     """
     Validates the access tokens for the specified broker without triggering interactive login.
     - If broker_name is 'upstox', only the Upstox token is validated.
@@ -64,291 +206,290 @@ def validate_tokens(broker_name: str = Query(..., description="The broker to che
         if broker_name.lower() != 'upstox':
             brokers_to_check.add('upstox')
 
-        if 'upstox' in brokers_to_check:
-            is_valid, _, login_url = session_manager.check_upstox_token_validity()
-            response_data['upstox'] = {
-                'is_valid': is_valid,
-                'message': 'Token is valid.' if is_valid else 'Token is invalid, missing, or expired.',
-                'login_url': login_url if not is_valid else None
-            }
-
-        if 'zerodha' in brokers_to_check:
-            is_valid, _, login_url = session_manager.check_kite_token_validity()
-            response_data['zerodha'] = {
+        checks = {
+            name: check
+            for name, check in (('upstox', session_manager.check_upstox_token_validity), ('zerodha', session_manager.check_kite_token_validity))
+            if name in brokers_to_check
+        }
+        # Each check is an independent HTTPS round trip, so run them side by side
+        results = await asyncio.gather(*(asyncio.to_thread(check) for check in checks.values()))
+        for name, (is_valid, _, login_url) in zip(checks, results):
+            response_data[name] = {
                 'is_valid': is_valid,
                 'message': 'Token is valid.' if is_valid else 'Token is invalid, missing, or expired.',
                 'login_url': login_url if not is_valid else None
             }
         
-        return JSONResponse(status_code=200, content=response_data)
+        return ORJSONResponse(status_code=200, content=response_data)
 
     except Exception as e:
-        return JSONResponse(status_code=500, content={"error": f"An unexpected error occurred: {str(e)}", "trace": traceback.format_exc()})
+        return _error_response(e, f"An unexpected error occurred: {str(e)}")
 
 @app.post("/session/generate-token")
-def generate_token(broker_name: str = Query(..., description="The broker to generate a token for ('kite', 'zerodha', 'upstox')"), redirected_url: str = Query(None, description="The redirected URL with the request token or code")):
+async def generate_token(broker_name: str = Query(..., description="The broker to generate a token for ('kite', 'zerodha', 'upstox')"), redirected_url: str = Query(None, description="The redirected URL with the request token or code")):
     try:
         session_manager = session.session_manager
         access_token = None
         broker_name_lower = broker_name.lower()
 
         if broker_name_lower == 'upstox':
-            access_token = session_manager.generate_new_upstox_token(redirected_url)
+            access_token = await asyncio.to_thread(session_manager.generate_new_upstox_token, redirected_url)
         elif broker_name_lower in ['kite', 'zerodha']:
-            kite = KiteConnect(api_key=session_manager.kite_api_key)
-            access_token = session_manager.generate_new_kite_token(kite, redirected_url)
+            kite = session_manager.get_kite_client()
+            access_token = await asyncio.to_thread(session_manager.generate_new_kite_token, kite, redirected_url)
         else:
-            return JSONResponse(status_code=400, content={"error": f"Broker '{broker_name}' is not supported for token generation."})
+            return ORJSONResponse(status_code=400, content={"error": f"Broker '{broker_name}' is not supported for token generation."})
 
         return {"message": f"New access token for {broker_name} generated and saved."}
     except Exception as e:
-        return JSONResponse(status_code=500, content={"error": str(e), "trace": traceback.format_exc()})
+        return _error_response(e)
 
 
 @app.post("/update-tradebook")
-def update_tradebook():
+async def update_tradebook():
     try:
-        session.refresh_all_caches()
-        holdings_analyzer = HoldingsAnalyzer(session.broker.user_id, session.broker.broker_name)
-        summary = holdings_analyzer.update_tradebook(session.broker)
+        await asyncio.to_thread(session.refresh_all_caches, force=True)
+        broker = session.broker
+        holdings_analyzer = _holdings_analyzer(broker.user_id, broker.broker_name)
+        summary = await asyncio.to_thread(holdings_analyzer.update_tradebook, broker)
         return {"message": "Tradebook updated successfully.", "summary": summary}
     except Exception as e:
-        return JSONResponse(status_code=500, content={"error": str(e)})
+        return _error_response(e)
 
 @app.post("/write-roi")
-def write_roi():
+async def write_roi():
     try:
-        session.refresh_all_caches()
-        holdings_analyzer = HoldingsAnalyzer(session.broker.user_id, session.broker.broker_name)
+        await asyncio.to_thread(session.refresh_all_caches, force=True)
+        broker = session.broker
+        holdings_analyzer = _holdings_analyzer(broker.user_id, broker.broker_name)
         # In the CLI, this is called from analyze_holdings. 
         # This endpoint might need to be re-evaluated or accept data.
-        results = holdings_analyzer.analyze_holdings(session.broker, session.get_cmp_manager())
-        holdings_analyzer.write_roi_results(results)
+        results = await asyncio.to_thread(holdings_analyzer.analyze_holdings, broker, session.get_cmp_manager())
+        await asyncio.to_thread(holdings_analyzer.write_roi_results, results)
         return {"message": "ROI results written successfully."}
     except Exception as e:
-        return JSONResponse(status_code=500, content={"error": str(e)})
+        return _error_response(e)
 
 @app.get("/entry-levels/duplicates")
-def check_duplicates():
+async def check_duplicates(request: Request, response: Response, fresh: bool = Query(False, description="Refresh caches even if they were refreshed moments ago")):
     try:
-        session.refresh_all_caches()
+        digest = await asyncio.to_thread(_refreshed, fresh, session.cache_digest, "entry_levels")
+        not_modified = _not_modified(request, response, digest)
+        if not_modified:
+            return not_modified
         scrips = session.get_entry_levels()
-        duplicates = detect_duplicates(scrips)
+        duplicates = await asyncio.to_thread(_entry_level_duplicates, scrips)
         return {"duplicates": duplicates}
     except Exception as e:
-        return JSONResponse(status_code=500, content={"error": str(e)})
+        return _error_response(e)
 
 @app.get("/entry-levels/gtt-plan")
-def list_entry_levels(filter_ltp: float = Query(None, description="Filter orders with LTP greater than this value")):
+async def list_entry_levels(filter_ltp: float = Query(None, description="Filter orders with LTP greater than this value"), fresh: bool = Query(False, description="Refresh caches even if they were refreshed moments ago")):
     try:
-        session.refresh_all_caches()
+        await asyncio.to_thread(session.refresh_all_caches, force=fresh)
         
-        duplicates = detect_duplicates(session.get_entry_levels())
+        snapshot = session.snapshot()
+        duplicates = _entry_level_duplicates(snapshot.entry_levels)
 
         planner = MultiLevelEntryStrategy(
             broker=session.broker,
-            cmp_manager=session.get_cmp_manager(),
-            holdings=session.get_holdings(),
-            entry_levels=session.get_entry_levels(),
-            gtt_cache=session.get_gtt_cache()
+            cmp_manager=snapshot.cmp_manager,
+            holdings=snapshot.holdings,
+            entry_levels=snapshot.entry_levels,
+            gtt_cache=snapshot.gtt_cache
         )
 
-        candidates = planner.identify_candidates()
-        new_orders = planner.generate_plan(candidates)
+        new_orders = await asyncio.to_thread(_plan, planner.identify_candidates, planner.generate_plan)
         skipped_orders = planner.skipped_orders
 
-        session.write_gtt_plan(new_orders)
+        await asyncio.to_thread(session.write_gtt_plan, new_orders)
 
         if filter_ltp is not None:
             new_orders = [o for o in new_orders if o.get("ltp") and o["ltp"] > filter_ltp]
 
-        return {
-            "duplicates": duplicates,
-            "skipped_orders": skipped_orders,
-            "new_orders": new_orders
-        }
+        return _stream_json({"duplicates": duplicates, "skipped_orders": skipped_orders}, "new_orders", new_orders)
     except Exception as e:
-        return JSONResponse(status_code=500, content={"error": str(e), "trace": traceback.format_exc()})
+        return _error_response(e)
 
 @app.post("/gtt-orders/place")
-def place_gtt_orders():
+async def place_gtt_orders():
     try:
-        session.refresh_all_caches()
-        new_orders = session.read_gtt_plan()
+        new_orders = await asyncio.to_thread(_refreshed, True, session.read_gtt_plan)
         if not new_orders:
-            return JSONResponse(status_code=400, content={"error": "No GTT orders found in cache."})
+            return ORJSONResponse(status_code=400, content={"error": "No GTT orders found in cache."})
 
-        manager = GTTManager(session.broker, session.get_cmp_manager(), session)
-        placed_orders = manager.place_orders(new_orders, dry_run=False)
-        session.delete_gtt_plan()
+        manager = _gtt_manager()
+        placed_orders = await asyncio.to_thread(_place_and_clear_plan, manager, new_orders)
 
         return {
             "message": "GTT orders placed successfully.",
             "placed_orders": placed_orders
         }
     except Exception as e:
-        return JSONResponse(status_code=500, content={"error": str(e), "trace": traceback.format_exc()})
+        return _error_response(e)
 
 @app.get("/gtt-orders/variance")
-def analyze_gtt_variance(threshold: float = Query(100.0, description="Variance threshold to filter GTTs")):
+async def analyze_gtt_variance(request: Request, response: Response, threshold: float = Query(100.0, description="Variance threshold to filter GTTs"), fresh: bool = Query(False, description="Refresh caches even if they were refreshed moments ago")):
     try:
-        session.refresh_all_caches()
-        manager = GTTManager(session.broker, session.get_cmp_manager(), session)
-        orders = manager.analyze_gtt_buy_orders()
-        filtered = [o for o in orders if o["Variance (%)"] <= threshold]
+        digest = await asyncio.to_thread(_refreshed, fresh, session.cache_digest, "gtt", "cmp")
+        not_modified = _not_modified(request, response, digest)
+        if not_modified:
+            return not_modified
+        manager = _gtt_manager()
+        orders = await asyncio.to_thread(manager.analyze_gtt_buy_orders)
+        filtered = orders[:bisect.bisect_right(orders, threshold, key=_variance)]
         return {
             "threshold": threshold,
             "filtered_orders": filtered
         }
     except Exception as e:
-        return JSONResponse(status_code=500, content={"error": str(e)})
+        return _error_response(e)
 
 @app.post("/gtt-orders/adjust")
-def adjust_gtt_orders(target_variance: float = Query(..., description="Target variance to adjust GTTs")):
+async def adjust_gtt_orders(target_variance: float = Query(..., description="Target variance to adjust GTTs")):
     try:
-        session.refresh_all_caches()
-        manager = GTTManager(session.broker, session.get_cmp_manager(), session)
-        orders = manager.analyze_gtt_buy_orders()
-        to_adjust = [o for o in orders if o["Variance (%)"] < target_variance]
-        adjusted = manager.adjust_orders(to_adjust, target_variance, BaseEntryStrategy.adjust_trigger_and_order_price)
+        manager, orders = await asyncio.to_thread(_refreshed, True, _buy_orders)
+        to_adjust = orders[:bisect.bisect_left(orders, target_variance, key=_variance)]
+        adjusted = await asyncio.to_thread(manager.adjust_orders, to_adjust, target_variance, BaseEntryStrategy.adjust_trigger_and_order_price)
         return {"adjusted_orders": adjusted}
     except Exception as e:
-        return JSONResponse(status_code=500, content={"error": str(e)})
+        return _error_response(e)
 
 @app.delete("/gtt-orders/delete")
-def delete_gtt_orders(threshold: float = Query(..., description="Variance threshold above which GTTs will be deleted")):
+async def delete_gtt_orders(threshold: float = Query(..., description="Variance threshold above which GTTs will be deleted")):
     try:
-        session.refresh_all_caches()
-        manager = GTTManager(session.broker, session.get_cmp_manager(), session)
-        orders = manager.analyze_gtt_buy_orders()
-        to_delete = [o for o in orders if o["Variance (%)"] > threshold]
-        deleted = manager.delete_orders_above_variance(to_delete, threshold)
+        manager, orders = await asyncio.to_thread(_refreshed, True, _buy_orders)
+        to_delete = orders[bisect.bisect_right(orders, threshold, key=_variance):]
+        deleted = await asyncio.to_thread(manager.delete_orders_above_variance, to_delete, threshold)
         return {"deleted_symbols": deleted}
     except Exception as e:
-        return JSONResponse(status_code=500, content={"error": str(e)})
+        return _error_response(e)
 
 @app.get("/gtt-orders/duplicates")
-def list_duplicate_gtt_symbols():
+async def list_duplicate_gtt_symbols(request: Request, response: Response, fresh: bool = Query(False, description="Refresh caches even if they were refreshed moments ago")):
     try:
-        session.refresh_all_caches()
-        manager = GTTManager(session.broker, session.get_cmp_manager(), session)
-        duplicates = manager.get_duplicate_gtt_symbols()
+        digest = await asyncio.to_thread(_refreshed, fresh, session.cache_digest, "gtt")
+        not_modified = _not_modified(request, response, digest)
+        if not_modified:
+            return not_modified
+        manager = _gtt_manager()
+        duplicates = await asyncio.to_thread(manager.get_duplicate_gtt_symbols)
         return {"duplicates": duplicates}
     except Exception as e:
-        return JSONResponse(status_code=500, content={"error": str(e)})
+        return _error_response(e)
 
 @app.get("/gtt-orders/total-buy-amount")
-def show_total_buy_gtt_amount(threshold: float = Query(None, description="Optional variance threshold")):
+async def show_total_buy_gtt_amount(request: Request, response: Response, threshold: float = Query(None, description="Optional variance threshold"), fresh: bool = Query(False, description="Refresh caches even if they were refreshed moments ago")):
     try:
-        session.refresh_all_caches()
-        manager = GTTManager(session.broker, session.get_cmp_manager(), session)
-        total_amount = manager.get_total_buy_gtt_amount(threshold)
+        digest = await asyncio.to_thread(_refreshed, fresh, session.cache_digest, "gtt", "cmp")
+        not_modified = _not_modified(request, response, digest)
+        if not_modified:
+            return not_modified
+        manager = _gtt_manager()
+        total_amount = await asyncio.to_thread(manager.get_total_buy_gtt_amount, threshold)
         return {"total_buy_gtt_amount": total_amount}
     except Exception as e:
-        return JSONResponse(status_code=500, content={"error": str(e)})
+        return _error_response(e)
+
+@lru_cache(maxsize=128)
+def _parse_filters(filters: str) -> MappingProxyType:
+    # Dashboards poll with the same filter string; the read-only view keeps the cached dict intact
+    return MappingProxyType(orjson.loads(filters))
 
 @app.get("/holdings/analyze")
-def analyze_holdings(
+async def analyze_holdings(
     filters: str = Query(None, description="JSON string of filters"),
-    sort_by: str = Query("W ROI", description="Column to sort by (e.g., 'ROI/Day', 'P&L')")
+    sort_by: str = Query("W ROI", description="Column to sort by (e.g., 'ROI/Day', 'P&L')"),
+    fresh: bool = Query(False, description="Refresh caches even if they were refreshed moments ago")
 ):
     try:
-        session.refresh_all_caches()
-        holdings_analyzer = HoldingsAnalyzer(session.broker.user_id, session.broker.broker_name)
-        parsed_filters = json.loads(filters) if filters else {}
-        results = holdings_analyzer.analyze_holdings(
-            session.broker,
+        try:
+            parsed_filters = _parse_filters(filters) if filters else {}
+        except (orjson.JSONDecodeError, TypeError):
+            return ORJSONResponse(status_code=400, content={"error": "filters must be a JSON object."})
+
+        await asyncio.to_thread(session.refresh_all_caches, force=fresh)
+        broker = session.broker
+        holdings_analyzer = _holdings_analyzer(broker.user_id, broker.broker_name)
+        results = await asyncio.to_thread(
+            holdings_analyzer.analyze_holdings,
+            broker,
             session.get_cmp_manager(),
             parsed_filters,
             sort_by=sort_by
         )
 
-        for row in results:
-            trend = row.get("Trend", "-")
-            trend_days = row.get("Trend Days", "")
-            row["Trend"] = f"{trend}({trend_days})" if trend_days != "" else trend
-
-        return {"results": results}
+        # Trend is rendered as each row is encoded rather than in a separate pass
+        return _stream_json({}, "results", results, row_fn=format_trend)
     except Exception as e:
-        return JSONResponse(status_code=500, content={"error": str(e)})
+        return _error_response(e)
     
 
 
 @app.get("/dynamic-avg/plan")
-def plan_dynamic_avg():
+async def plan_dynamic_avg(fresh: bool = Query(False, description="Refresh caches even if they were refreshed moments ago")):
     """Generate a buy plan for the dynamic averaging strategy."""
     try:
-        session.refresh_all_caches()
-        from core.dynamic_avg import DynamicAveragingPlanner
-        planner = DynamicAveragingPlanner()
-        candidates = planner.identify_candidates()
-        plan = planner.generate_buy_plan(candidates)
-        session.write_gtt_plan(plan)
+        await asyncio.to_thread(session.refresh_all_caches, force=fresh)
+        planner = DynamicAveragingPlanner(session)
+        plan = await asyncio.to_thread(_plan, planner.identify_candidates, planner.generate_buy_plan)
+        await asyncio.to_thread(session.write_gtt_plan, plan)
         return {"plan": plan}
     except Exception as e:
-        return JSONResponse(status_code=500, content={"error": str(e), "trace": traceback.format_exc()})
+        return _error_response(e)
 
 @app.post("/dynamic-averaging/place")
-def place_dynamic_averaging_orders():
+async def place_dynamic_averaging_orders():
     """Place GTT orders from cached dynamic averaging plan, deleting existing GTTs for symbols in the plan."""
     try:
-        session.refresh_all_caches()
-        new_orders = session.read_gtt_plan()
+        new_orders = await asyncio.to_thread(_refreshed, True, session.read_gtt_plan)
 
         if not new_orders:
-            return JSONResponse(status_code=400, content={"error": "No dynamic averaging GTT orders found in cache."})
+            return ORJSONResponse(status_code=400, content={"error": "No dynamic averaging GTT orders found in cache."})
 
-        manager = GTTManager(session.broker, session.get_cmp_manager(), session)
+        manager = _gtt_manager()
 
         # --- Deletion Logic from CLI ---
         deleted_gtt_symbols = []
         new_plan_symbols = {order["symbol"] for order in new_orders}
         if new_plan_symbols:
-            all_gtts = session.get_gtt_cache()
-            
-            symbols_to_delete = []
-            for g in all_gtts:
-                details = manager._parse_gtt(g)
-                if details.get("status") == "active":
-                    symbol = details.get("symbol")
-                    if symbol in new_plan_symbols:
-                        symbols_to_delete.append(symbol)
-            
-            symbols_to_delete = list(set(symbols_to_delete))
+            active_by_symbol = await asyncio.to_thread(manager.get_active_gtts_by_symbol)
+            symbols_to_delete = new_plan_symbols & active_by_symbol.keys()
 
             if symbols_to_delete:
-                deleted_gtt_symbols = manager.delete_gtts_for_symbols(symbols_to_delete)
+                deleted_gtt_symbols = await asyncio.to_thread(manager.delete_gtts_for_symbols, symbols_to_delete)
         # --- End Deletion Logic ---
         
-        placed_orders = manager.place_orders(new_orders, dry_run=False)
-        session.delete_gtt_plan()
+        placed_orders = await asyncio.to_thread(_place_and_clear_plan, manager, new_orders)
         return {
             "message": "Dynamic averaging GTT orders placed successfully.",
             "placed_orders": placed_orders,
             "deleted_gtts": deleted_gtt_symbols
         }
     except Exception as e:
-        return JSONResponse(status_code=500, content={"error": str(e), "trace": traceback.format_exc()})
+        return _error_response(e)
 
 @app.get("/holdings/total-invested")
-def get_total_invested_amount():
+async def get_total_invested_amount(fresh: bool = Query(False, description="Refresh caches even if they were refreshed moments ago")):
     try:
-        session.refresh_all_caches()
+        await asyncio.to_thread(session.refresh_all_caches, force=fresh)
         holdings = session.get_holdings()
-        analyzer = HoldingsAnalyzer(session.broker.user_id, session.broker.broker_name)
+        broker = session.broker
+        analyzer = _holdings_analyzer(broker.user_id, broker.broker_name)
         total = analyzer.get_total_invested(holdings)
         return {"total_invested": round(total, 2)}
     except Exception as e:
-        return JSONResponse(status_code=500, content={"error": str(e)})
+        return _error_response(e)
 
 @app.post("/trades/download-historical")
-def download_historical_trades_api(start_date: str = Query(..., description="Start date in YYYY-MM-DD format"), end_date: str = Query(..., description="End date in YYYY-MM-DD format")):
+async def download_historical_trades_api(start_date: str = Query(..., description="Start date in YYYY-MM-DD format"), end_date: str = Query(..., description="End date in YYYY-MM-DD format")):
     try:
-        if not session.broker:
-            return JSONResponse(status_code=400, content={"error": "Session not initialized."})
+        broker = session.broker
+        if not broker:
+            return ORJSONResponse(status_code=400, content={"error": "Session not initialized."})
 
-        holdings_analyzer = HoldingsAnalyzer(session.broker.user_id, session.broker.broker_name)
-        summary = holdings_analyzer.download_historical_trades(session.broker, start_date, end_date)
+        holdings_analyzer = _holdings_analyzer(broker.user_id, broker.broker_name)
+        summary = await asyncio.to_thread(holdings_analyzer.download_historical_trades, broker, start_date, end_date)
         return summary
     except Exception as e:
-        return JSONResponse(status_code=500, content={"error": str(e), "trace": traceback.format_exc()})
+        return _error_response(e)
@@ -3,6 +3,8 @@ import json
 import os
 import logging
 import traceback
+import bisect
+from operator import itemgetter
 
 from core.entry import detect_duplicates
 from core.multilevel_entry import MultiLevelEntryStrategy
@@ -20,17 +22,33 @@ def set_current_session(s):
 
 def get_holdings_analyzer():
     if current_session:
-        if hasattr(current_session, 'broker'):
-            if current_session.broker:
-                broker = current_session.broker
-                has_user_id = hasattr(broker, 'user_id')
-                has_broker_name = hasattr(broker, 'broker_name')
-                logging.debug(f"get_holdings_analyzer: broker has user_id: {has_user_id}, broker_name: {has_broker_name}")
-                if has_user_id and has_broker_name:
-                    return HoldingsAnalyzer(broker.user_id, broker.broker_name)
+        broker = getattr(current_session, 'broker', None)
+        if broker:
+            has_user_id = hasattr(broker, 'user_id')
+            has_broker_name = hasattr(broker, 'broker_name')
+            logging.debug(f"get_holdings_analyzer: broker has user_id: {has_user_id}, broker_name: {has_broker_name}")
+            if has_user_id and has_broker_name:
+                return HoldingsAnalyzer(broker.user_id, broker.broker_name)
     logging.info("get_holdings_analyzer: returning None")
     return None
 
+def get_gtt_manager() -> GTTManager:
+    """
+    Returns the session's GTTManager, so commands run back to back in one session
+    reuse its parsed GTTs and variance analysis until a refresh.
+    """
+    return current_session.get_gtt_manager()
+
+# Read-only commands reuse broker data fetched within this many seconds, so commands
+# run back to back from the menu don't re-pull everything. Commands that place,
+# adjust or delete GTTs always refresh first.
+CLI_CACHE_MAX_AGE = 30.0
+
+# analyze_gtt_buy_orders returns orders sorted by this key, so variance
+# thresholds split the list with a binary search instead of a scan.
+_variance = itemgetter("Variance (%)")
+_symbol = itemgetter("Symbol")
+
 GTT_PLAN_CACHE_PATH = "data/gtt_plan_cache.json"
 
 from core.utils import setup_logging
@@ -41,7 +59,7 @@ setup_logging(logging.INFO)
 @app.command()
 def write_roi():
     """Write ROI results to master CSV."""
-    current_session.refresh_all_caches()
+    current_session.refresh_all_caches(max_age=CLI_CACHE_MAX_AGE)
     results = []  # Placeholder
     holdings_analyzer = get_holdings_analyzer()
     if holdings_analyzer:
@@ -50,7 +68,7 @@ def write_roi():
 @app.command()
 def check_duplicates():
     """Check for duplicate symbols in entry levels."""
-    current_session.refresh_all_caches()
+    current_session.refresh_all_caches(max_age=CLI_CACHE_MAX_AGE)
     scrips = current_session.get_entry_levels()
     duplicates = detect_duplicates(scrips)
     if duplicates:
@@ -64,9 +82,10 @@ def check_duplicates():
 def list_entry_levels(filter_ltp: float = typer.Option(None, help="Filter orders with LTP greater than this value")):
     """List GTT orders based on multi-level entry strategy."""
     try:
-        current_session.refresh_all_caches()
-        
-        duplicates = detect_duplicates(current_session.get_entry_levels())
+        current_session.refresh_all_caches(max_age=CLI_CACHE_MAX_AGE)
+        snapshot = current_session.snapshot()
+
+        duplicates = detect_duplicates(snapshot.entry_levels)
         if duplicates:
             print("\n⚠️ Duplicate entries found in entry_levels.csv:")
             print("  " + ", ".join(duplicates))
@@ -76,10 +95,10 @@ def list_entry_levels(filter_ltp: float = typer.Option(None, help="Filter orders
         # 1. Instantiate the planner with the new signature
         planner = MultiLevelEntryStrategy(
             broker=current_session.broker,
-            cmp_manager=current_session.get_cmp_manager(),
-            holdings=current_session.get_holdings(),
-            entry_levels=current_session.get_entry_levels(),
-            gtt_cache=current_session.get_gtt_cache()
+            cmp_manager=snapshot.cmp_manager,
+            holdings=snapshot.holdings,
+            entry_levels=snapshot.entry_levels,
+            gtt_cache=snapshot.gtt_cache
         )
 
         # 2. Identify candidates and generate the plan
@@ -105,20 +124,20 @@ def list_entry_levels(filter_ltp: float = typer.Option(None, help="Filter orders
             new_orders = [o for o in new_orders if o.get("ltp") and o["ltp"] > filter_ltp]
 
         if new_orders:
-            display_orders = []
-            for order in new_orders:
-                order_amount = round(order["price"] * order["qty"], 2)
-                display_orders.append({
+            display_orders = [
+                {
                     "Symbol": order["symbol"],
                     "Order Price": order["price"],
                     "Trigger Price": order["trigger"],
                     "LTP": order["ltp"],
-                    "Order Amount": order_amount,
+                    "Order Amount": round(order["price"] * order["qty"], 2),
                     "Entry Level": order["entry"]
-                })
+                }
+                for order in new_orders
+            ]
 
             print_table(
-                sorted(display_orders, key=lambda item: item['Symbol']),
+                sorted(display_orders, key=_symbol),
                 ["Symbol", "Order Price", "Trigger Price", "LTP", "Order Amount", "Entry Level"],
                 title="📊 New GTT Plan - Multi-Level Entry Strategy",
                 spacing=6
@@ -134,14 +153,14 @@ def list_entry_levels(filter_ltp: float = typer.Option(None, help="Filter orders
 @app.command()
 def place_gtt_orders():
     """Place GTT orders from cached plan."""
-    current_session.refresh_all_caches()
+    current_session.refresh_all_caches(force=True)
     new_orders = current_session.read_gtt_plan()
 
     if not new_orders:
         logging.debug("No GTT orders found in cache.")
         return
 
-    manager = GTTManager(current_session.broker, current_session.get_cmp_manager(), current_session)
+    manager = get_gtt_manager()
 
     print("\n📦 Placing GTT orders...")
 
@@ -166,27 +185,25 @@ def place_gtt_orders():
 @app.command()
 def place_dynamic_averaging_orders():
     """Place GTT orders from cached dynamic averaging plan, deleting existing GTTs for symbols in the plan."""
-    current_session.refresh_all_caches()
+    current_session.refresh_all_caches(force=True)
     new_orders = current_session.read_gtt_plan()  # Assuming plan_dynamic_avg writes to the same cache as list_entry_levels
 
     if not new_orders:
         print("⚠️ No dynamic averaging GTT orders found in cache.")
         return
 
-    manager = GTTManager(current_session.broker, current_session.get_cmp_manager(), current_session)
+    manager = get_gtt_manager()
 
     # --- Deletion Logic ---
     new_plan_symbols = {order["symbol"] for order in new_orders}
     if new_plan_symbols:
-        all_gtts = current_session.get_gtt_cache()
-        symbols_to_delete = []
-        for g in all_gtts:
-            if g.get("status", "").lower() == "active" and g.get("orders") and g["orders"][0].get("transaction_type") == "BUY":
-                symbol = g.get("condition", {}).get("tradingsymbol")
-                if symbol and symbol in new_plan_symbols:
-                    symbols_to_delete.append(symbol)
-        
-        symbols_to_delete = list(set(symbols_to_delete))
+        symbols_to_delete = {
+            details["symbol"]
+            for details in manager.get_parsed_gtts()
+            if details["symbol"] in new_plan_symbols
+            and (details["status"] or "").lower() == "active"
+            and details["transaction_type"] == "BUY"
+        }
 
         if symbols_to_delete:
             logging.debug(f"Attempting to delete existing GTTs for symbols in dynamic averaging plan: {symbols_to_delete}")
@@ -223,10 +240,10 @@ def place_dynamic_averaging_orders():
 @app.command()
 def adjust_gtt_orders(target_variance: float = typer.Option(..., help="Target variance to adjust GTTs")):
     """Adjust GTT orders to match target variance."""
-    current_session.refresh_all_caches()
-    manager = GTTManager(current_session.broker, current_session.get_cmp_manager(), current_session)
+    current_session.refresh_all_caches(force=True)
+    manager = get_gtt_manager()
     orders = manager.analyze_gtt_buy_orders()
-    to_adjust = [o for o in orders if o["Variance (%)"] < target_variance]
+    to_adjust = orders[:bisect.bisect_left(orders, target_variance, key=_variance)]
 
     from core.entry import BaseEntryStrategy
     adjusted_symbols = manager.adjust_orders(to_adjust, target_variance, BaseEntryStrategy.adjust_trigger_and_order_price)
@@ -235,10 +252,10 @@ def adjust_gtt_orders(target_variance: float = typer.Option(..., help="Target va
 @app.command()
 def delete_gtt_orders(threshold: float = typer.Option(..., help="Variance threshold above which GTTs will be deleted")):
     """Delete GTT orders above variance threshold."""
-    current_session.refresh_all_caches()
-    manager = GTTManager(current_session.broker, current_session.get_cmp_manager(), current_session)
+    current_session.refresh_all_caches(force=True)
+    manager = get_gtt_manager()
     orders = manager.analyze_gtt_buy_orders()
-    to_delete = [o for o in orders if o["Variance (%)"] > threshold]
+    to_delete = orders[bisect.bisect_right(orders, threshold, key=_variance):]
 
     deleted = manager.delete_orders_above_variance(to_delete, threshold)
 
@@ -254,11 +271,11 @@ def delete_gtt_orders(threshold: float = typer.Option(..., help="Variance thresh
 @app.command()
 def analyze_gtt_variance(threshold: float = typer.Option(100.0, help="Variance threshold to filter GTTs")):
     """Analyze buy GTT orders and display those below a variance threshold."""
-    current_session.refresh_all_caches()
-    manager = GTTManager(current_session.broker, current_session.get_cmp_manager(), current_session)
+    current_session.refresh_all_caches(max_age=CLI_CACHE_MAX_AGE)
+    manager = get_gtt_manager()
 
     orders = manager.analyze_gtt_buy_orders()
-    filtered = [o for o in orders if o["Variance (%)"] <= threshold]
+    filtered = orders[:bisect.bisect_right(orders, threshold, key=_variance)]
 
     print_table(
         filtered,
@@ -269,8 +286,8 @@ def analyze_gtt_variance(threshold: float = typer.Option(100.0, help="Variance t
 @app.command()
 def list_duplicate_gtt_symbols():
     """List symbols with duplicate GTT orders."""
-    current_session.refresh_all_caches()
-    manager = GTTManager(current_session.broker, current_session.get_cmp_manager(), current_session)
+    current_session.refresh_all_caches(max_age=CLI_CACHE_MAX_AGE)
+    manager = get_gtt_manager()
 
     duplicates = manager.get_duplicate_gtt_symbols()
     return duplicates
@@ -278,8 +295,8 @@ def list_duplicate_gtt_symbols():
 @app.command()
 def show_total_buy_gtt_amount(threshold: float = None) -> float:
     """Show total capital required for buy GTT orders."""
-    current_session.refresh_all_caches()
-    manager = GTTManager(current_session.broker, current_session.get_cmp_manager(), current_session)
+    current_session.refresh_all_caches(max_age=CLI_CACHE_MAX_AGE)
+    manager = get_gtt_manager()
     
     total_amount = manager.get_total_buy_gtt_amount(threshold)
     return total_amount
@@ -293,7 +310,7 @@ def analyze_holdings(
     logging.debug("Entering analyze_holdings command.")
     logging.debug(f"Filters: {filters}, Sort by: {sort_by}")
     try:
-        current_session.refresh_all_caches()
+        current_session.refresh_all_caches(max_age=CLI_CACHE_MAX_AGE)
         parsed_filters = json.loads(filters) if filters else {}
         logging.debug("Getting holdings analyzer.")
         holdings_analyzer = get_holdings_analyzer()
@@ -303,16 +320,11 @@ def analyze_holdings(
                 current_session.broker,
                 current_session.get_cmp_manager(),
                 parsed_filters,
-                sort_by=sort_by
+                sort_by=sort_by,
+                render_trend=True
             )
             logging.debug(f"Received {len(results)} results from analyze_holdings.")
 
-            # 🔧 Format Trend field as 'UP(5)'
-            for row in results:
-                trend = row.get("Trend", "-")
-                trend_days = row.get("Trend Days", "")
-                row["Trend"] = f"{trend}({trend_days})" if trend_days != "" else trend
-
             print_table(
                 results,
                 ["Symbol", "Invested", "P&L", "Yld/Day", "Age", "P&L%", "ROI/Day", "W ROI", "Trend", "Quality"],
@@ -328,7 +340,7 @@ def analyze_holdings(
 @app.command()
 def update_tradebook():
     """Update tradebook from broker and show summary."""
-    current_session.refresh_all_caches()
+    current_session.refresh_all_caches(max_age=CLI_CACHE_MAX_AGE)
     holdings_analyzer = get_holdings_analyzer()
     if holdings_analyzer:
         summary = holdings_analyzer.update_tradebook(current_session.broker)
@@ -338,7 +350,7 @@ def update_tradebook():
 
 @app.command()
 def get_total_invested_amount():
-    current_session.refresh_all_caches()
+    current_session.refresh_all_caches(max_age=CLI_CACHE_MAX_AGE)
     holdings = current_session.get_holdings()
     analyzer = get_holdings_analyzer()
     if analyzer:
@@ -348,15 +360,14 @@ def get_total_invested_amount():
 @app.command()
 def plan_dynamic_avg():
     """Plan GTT buy orders for dynamic averaging strategy."""
-    current_session.refresh_all_caches()
+    current_session.refresh_all_caches(max_age=CLI_CACHE_MAX_AGE)
     from core.dynamic_avg import DynamicAveragingPlanner
     planner = DynamicAveragingPlanner(current_session)
     candidates = planner.identify_candidates()
     plan = planner.generate_buy_plan(candidates)
 
-    display_plan = []
-    for order in plan:
-        display_plan.append({
+    display_plan = [
+        {
             "Symbol": order["symbol"],
             "Order Price": order["price"],
             "Trigger Price": order["trigger"],
@@ -364,11 +375,13 @@ def plan_dynamic_avg():
             "Order Amt": round(order["qty"] * order["price"], 2),
             "DA Leg": order["leg"],
             "Entry Level": order["entry"],
-        })
+        }
+        for order in plan
+    ]
 
     if display_plan:
         print_table(
-            sorted(display_plan, key=lambda item: item['Symbol']),
+            sorted(display_plan, key=_symbol),
             ["Symbol", "Order Price", "Trigger Price", "LTP", "Order Amt",  "DA Leg", "Entry Level"],
             title="📉 Dynamic Averaging Buy Plan",
             spacing=6
@@ -410,8 +423,6 @@ def download_historical_trades(start_date: str = typer.Option(..., help="Start d
     except Exception as e:
         print(f"❌ Error downloading historical trades: {e}")
 
-from agent.manager import AgentManager
-
 @app.command()
 def ask_ai_analyst():
     """
@@ -421,6 +432,8 @@ def ask_ai_analyst():
         print("❌ Broker session not initialized. Please login first.")
         return
 
+    # Imported here: the Gemini SDK is the slowest import in the CLI and only this command needs it
+    from agent.manager import AgentManager
     agent_manager = AgentManager(current_session.broker)
     while True:
         try:
@@ -428,8 +441,9 @@ def ask_ai_analyst():
             if not user_query:
                 break
 
-            response = agent_manager.ask(user_query)
-            print(response)
+            for chunk in agent_manager.ask_stream(user_query):
+                print(chunk, end="", flush=True)
+            print()
 
         except Exception as e:
             print(f"❌ An unexpected error occurred: {e}")
\ No newline at end of file
@@ -2,11 +2,13 @@ import os
 import time
 import logging
 import requests
-import pandas as pd
 
-from core.utils import read_csv
+from core.utils import read_csv, get_symbol_isin_map
 
 class CMPManager:
+    # Upstox's market quote endpoint accepts up to 500 instrument keys per request
+    QUOTE_BATCH_SIZE = 500
+
     def __init__(self, csv_path: str, broker, session_manager, ttl: int = 600):
         self.csv_path = csv_path
         self.cache = {}
@@ -38,14 +40,12 @@ class CMPManager:
     # ──────────────── Instrument Key Mapping ──────────────── #
     def _get_instrument_key(self, symbol, segment):
         try:
-            df = pd.read_csv(self.csv_path)
-            df.columns = [col.strip() for col in df.columns]
             symbol_clean = symbol.replace("-BE", "").strip().upper()
-            match = df[df['SYMBOL'].str.upper() == symbol_clean]
-            if not match.empty:
-                isin = match.iloc[0]['ISIN NUMBER']
-                if pd.notna(isin) and str(isin).strip():
-                    return f"{segment}|{isin.strip()}"
+            isin_map = get_symbol_isin_map(self.csv_path)
+            if symbol_clean in isin_map:
+                isin = isin_map[symbol_clean]
+                if isin:
+                    return f"{segment}|{isin}"
                 else:
                     logging.warning(f"Missing ISIN for {symbol_clean}")
             else:
@@ -85,10 +85,9 @@ class CMPManager:
             return {}
 
         quote_map = {}
-        batch_size = 50
 
-        for i in range(0, len(instrument_keys), batch_size):
-            batch_keys = instrument_keys[i:i + batch_size]
+        for i in range(0, len(instrument_keys), self.QUOTE_BATCH_SIZE):
+            batch_keys = instrument_keys[i:i + self.QUOTE_BATCH_SIZE]
             response = self._fetch_quotes(token, batch_keys)
 
             if response.status_code == 401:
@@ -8,10 +8,11 @@ class DynamicAveragingPlanner:
     def __init__(self, session, trigger_offset_factor=0.3):
         self.session = session
         self.broker = self.session.broker
-        self.cmp_manager = self.session.get_cmp_manager()
-        self.holdings = self.session.get_holdings()
-        self.entry_levels = self.session.get_entry_levels()
-        self.gtt_cache = self.session.get_gtt_cache()
+        snapshot = self.session.snapshot()
+        self.cmp_manager = snapshot.cmp_manager
+        self.holdings = snapshot.holdings
+        self.entry_levels = snapshot.entry_levels
+        self.gtt_cache = snapshot.gtt_cache
         self.planner = MultiLevelEntryStrategy(self.broker, self.cmp_manager, self.holdings, self.entry_levels, self.gtt_cache)
         self.skipped_symbols = []
         self.trigger_offset_factor = trigger_offset_factor
@@ -3,7 +3,6 @@ import logging
 from collections import Counter
 from typing import List, Dict
 from abc import ABC, abstractmethod
-from core.session_singleton import shared_session as session
 
 class BaseEntryStrategy(ABC):
     def __init__(self, broker, cmp_manager, holdings=None):
@@ -1,12 +1,51 @@
+import time
+import random
 import logging
-from typing import List, Dict, Callable
+import numpy as np
+from typing import List, Dict, Callable, Iterable
 from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+# Broker GTT calls are independent HTTPS round trips, so place/adjust/delete issue
+# up to this many at once. Kept low to stay inside the brokers' per-second limits.
+GTT_ORDER_WORKERS = 4
+_ORDER_POOL = ThreadPoolExecutor(max_workers=GTT_ORDER_WORKERS, thread_name_prefix="gtt-order")
+# Retries for a GTT call the broker rejected with HTTP 429, backing off 0.5s, 1s, 2s plus jitter
+RATE_LIMIT_RETRIES = 3
+RATE_LIMIT_BACKOFF = 0.5
+
+def _is_rate_limited(e: Exception) -> bool:
+    # kiteconnect exceptions carry the HTTP status as `code`; requests errors carry the response
+    response = getattr(e, "response", None)
+    status = getattr(response, "status_code", None) if response is not None else getattr(e, "code", None)
+    return status == 429
+
+def _with_backoff(call, *args, **kwargs):
+    """
+    Runs a broker call, retrying with exponential backoff while the broker
+    answers 429. A rejected request was not applied, so it is safe to resend.
+    """
+    for attempt in range(RATE_LIMIT_RETRIES + 1):
+        try:
+            return call(*args, **kwargs)
+        except Exception as e:
+            if attempt == RATE_LIMIT_RETRIES or not _is_rate_limited(e):
+                raise
+            time.sleep(RATE_LIMIT_BACKOFF * (2 ** attempt) + random.uniform(0, RATE_LIMIT_BACKOFF / 2))
 
 class GTTManager:
     def __init__(self, broker, cmp_manager, session):
         self.broker = broker
         self.cmp_manager = cmp_manager
         self.session = session
+        # (GTT cache list, its parsed details), replaced whenever the session swaps in a new GTT list
+        self._parsed_cache = (None, [])
+        # (parsed GTTs, CMP quotes, variance index) backing threshold queries in get_total_buy_gtt_amount
+        self._variance_index_cache = (None, None, None)
+        # (parsed GTTs, CMP quotes, sorted rows) backing analyze_gtt_buy_orders
+        self._buy_orders_cache = (None, None, [])
+        # (parsed GTTs, {symbol: [active parsed GTTs]}) backing get_active_gtts_by_symbol
+        self._symbol_index_cache = (None, {})
 
     def _parse_gtt(self, g: Dict) -> Dict:
         """Parses a GTT object to extract key details into a flat dictionary."""
@@ -28,66 +67,114 @@ class GTTManager:
         
         return details
 
+    def get_parsed_gtts(self) -> List[Dict]:
+        """
+        Returns `_parse_gtt` details for every GTT in the session cache. The parsed
+        list is reused until the session refreshes its GTT cache; treat it as read-only.
+        """
+        gtts = self.session.get_gtt_cache()
+        source, parsed = self._parsed_cache
+        if source is not gtts:
+            parsed = [self._parse_gtt(g) for g in gtts]
+            self._parsed_cache = (gtts, parsed)
+        return parsed
+
+    def get_active_gtts_by_symbol(self) -> Dict[str, List[Dict]]:
+        """
+        Returns the active parsed GTTs grouped by symbol. Rebuilt only when the
+        parsed GTT list changes; treat it as read-only.
+        """
+        parsed = self.get_parsed_gtts()
+        source, index = self._symbol_index_cache
+        if source is not parsed:
+            index = {}
+            for details in parsed:
+                if details.get("status") == "active" and details.get("symbol"):
+                    index.setdefault(details["symbol"], []).append(details)
+            self._symbol_index_cache = (parsed, index)
+        return index
+
     def place_orders(self, gtt_plan: List[Dict], dry_run: bool = False) -> List[Dict]:
         """
-        Places GTT orders based on the generated plan.
+        Places GTT orders based on the generated plan. Placements run concurrently
+        on the order pool; results keep the order of `gtt_plan`.
         """
-        results = []
-        for order in gtt_plan:
-            if order.get("skip_reason"):
-                results.append({**order, "status": "Skipped", "remarks": order["skip_reason"]})
-                continue
+        if dry_run:
+            results = [self._place_order(order, dry_run=True) for order in gtt_plan]
+        else:
+            results = list(_ORDER_POOL.map(self._place_order, gtt_plan))
 
-            symbol = order["symbol"]
-            result = {
-                "symbol": symbol,
-                "price": order["price"],
-                "trigger": order["trigger"],
-                "status": "Success",
-                "remarks": ""
-            }
+        self.session.refresh_gtt_cache()
+        return results
 
-            if not dry_run:
-                try:
-                    self.broker.place_gtt(
-                        trigger_type=self.broker.GTT_TYPE_SINGLE,
-                        tradingsymbol=symbol,
-                        exchange=order["exchange"],
-                        trigger_values=[order["trigger"]],
-                        last_price=order["ltp"],
-                        orders=[
-                            {
-                                "transaction_type": self.broker.TRANSACTION_TYPE_BUY,
-                                "quantity": order["qty"],
-                                "order_type": self.broker.ORDER_TYPE_LIMIT,
-                                "product": self.broker.PRODUCT_CNC,
-                                "price": order["price"]
-                            }
-                        ]
-                    )
-                except Exception as e:
-                    result["status"] = "Fail"
-                    result["remarks"] = str(e)
-                    logging.error(f"[ERROR] ❌ Failed to place GTT for {symbol}: {e}")
+    def _place_order(self, order: Dict, dry_run: bool = False) -> Dict:
+        if order.get("skip_reason"):
+            return {**order, "status": "Skipped", "remarks": order["skip_reason"]}
+
+        symbol = order["symbol"]
+        result = {
+            "symbol": symbol,
+            "price": order["price"],
+            "trigger": order["trigger"],
+            "status": "Success",
+            "remarks": ""
+        }
 
-            results.append(result)
+        if not dry_run:
+            try:
+                _with_backoff(
+                    self.broker.place_gtt,
+                    trigger_type=self.broker.GTT_TYPE_SINGLE,
+                    tradingsymbol=symbol,
+                    exchange=order["exchange"],
+                    trigger_values=[order["trigger"]],
+                    last_price=order["ltp"],
+                    orders=[
+                        {
+                            "transaction_type": self.broker.TRANSACTION_TYPE_BUY,
+                            "quantity": order["qty"],
+                            "order_type": self.broker.ORDER_TYPE_LIMIT,
+                            "product": self.broker.PRODUCT_CNC,
+                            "price": order["price"]
+                        }
+                    ]
+                )
+            except Exception as e:
+                result["status"] = "Fail"
+                result["remarks"] = str(e)
+                logging.error(f"[ERROR] ❌ Failed to place GTT for {symbol}: {e}")
 
-        self.session.refresh_gtt_cache()
-        return results
+        return result
 
     # ──────────────── GTT Analysis ──────────────── #
+    def _current_quotes(self) -> Dict:
+        """
+        Returns the CMP quote dict the variance caches are keyed on. Raises like
+        CMPManager.get_quote once the quotes have expired, so a cached analysis
+        is never served past the CMP TTL.
+        """
+        if not self.cmp_manager._is_cache_valid():
+            raise RuntimeError("CMP cache is stale. Please refresh it first.")
+        return self.cmp_manager.cache
+
     def analyze_gtt_buy_orders(self) -> List[Dict]:
+        """
+        Returns active BUY GTTs with their LTP variance, sorted by "Variance (%)".
+        Recomputed only when the parsed GTTs or the CMP quotes change; each call
+        gets its own copies of the rows.
+        """
         try:
-            gtts = self.session.get_gtt_cache()
+            parsed, quotes = self.get_parsed_gtts(), self._current_quotes()
+            cached_parsed, cached_quotes, cached_orders = self._buy_orders_cache
+            if cached_parsed is parsed and cached_quotes is quotes:
+                return [dict(row) for row in cached_orders]
+
             orders = []
+            buy = self.broker.TRANSACTION_TYPE_BUY
+            get_cmp = self.cmp_manager.get_cmp
 
-            for g in gtts:
-                details = self._parse_gtt(g)
-                
-                if details.get("status") != "active":
-                    continue
-                
-                if details.get("transaction_type") != self.broker.TRANSACTION_TYPE_BUY:
+            for details in parsed:
+                if details.get("status") != "active" or details.get("transaction_type") != buy:
                     continue
 
                 symbol = details.get("symbol")
@@ -97,7 +184,7 @@ class GTTManager:
                 if not symbol or not exchange or trigger is None:
                     continue
 
-                ltp = self.cmp_manager.get_cmp(exchange, symbol)
+                ltp = get_cmp(exchange, symbol)
                 if ltp is None:
                     logging.warning(f"Skipping {symbol} due to missing LTP.")
                     continue
@@ -120,7 +207,9 @@ class GTTManager:
                     }
                 )
 
-            return sorted(orders, key=lambda x: x["Variance (%)"])
+            orders.sort(key=lambda x: x["Variance (%)"])
+            self._buy_orders_cache = (parsed, quotes, orders)
+            return [dict(row) for row in orders]
 
         except Exception as e:
             logging.error(f"Error computing GTT buy order analysis: {e}")
@@ -128,11 +217,8 @@ class GTTManager:
         
     def get_duplicate_gtt_symbols(self) -> List[str]:
         try:
-            gtts = self.session.get_gtt_cache()
-            
             active_buy_symbols = []
-            for g in gtts:
-                details = self._parse_gtt(g)
+            for details in self.get_parsed_gtts():
                 if (details.get("status") == "active" and 
                     details.get("transaction_type") == self.broker.TRANSACTION_TYPE_BUY and 
                     details.get("symbol")):
@@ -145,40 +231,58 @@ class GTTManager:
             logging.error(f"Error computing duplicate GTT symbols: {e}")
             return []
 
-    def get_total_buy_gtt_amount(self, threshold: float = None) -> float:
-        try:
-            gtts = self.session.get_gtt_cache()
-            total_amount = 0.0
-
-            for g in gtts:
-                details = self._parse_gtt(g)
-
-                if details.get("status") != "active":
-                    continue
-                
-                if details.get("transaction_type") != self.broker.TRANSACTION_TYPE_BUY or not details.get("price") or not details.get("qty"):
-                    continue
+    def _active_buy_amounts(self) -> List[tuple]:
+        """(details, price * qty) for active BUY GTTs that have a price and quantity."""
+        return [
+            (details, details["price"] * details["qty"])
+            for details in self.get_parsed_gtts()
+            if details.get("status") == "active"
+            and details.get("transaction_type") == self.broker.TRANSACTION_TYPE_BUY
+            and details.get("price") and details.get("qty")
+        ]
+
+    def _buy_amount_by_variance(self):
+        """
+        Returns (variances, cumulative_amounts): the variance of each priced active BUY
+        GTT in ascending order, and the running total of their amounts in that order.
+        Rebuilt only when the parsed GTTs or the CMP quotes change.
+        """
+        parsed, quotes = self.get_parsed_gtts(), self._current_quotes()
+        cached_parsed, cached_quotes, index = self._variance_index_cache
+        if cached_parsed is parsed and cached_quotes is quotes:
+            return index
+
+        variances, amounts = [], []
+        for details, amount in self._active_buy_amounts():
+            trigger = details.get("trigger")
+            symbol = details.get("symbol")
+            exchange = details.get("exchange")
+
+            if trigger is None or exchange is None or symbol is None:
+                continue
 
-                if threshold is not None:
-                    trigger = details.get("trigger")
-                    symbol = details.get("symbol")
-                    exchange = details.get("exchange")
-                    
-                    if trigger is None or exchange is None or symbol is None:
-                        continue
+            ltp = self.cmp_manager.get_cmp(exchange, symbol)
 
-                    ltp = self.cmp_manager.get_cmp(exchange, symbol)
+            if ltp is None:
+                continue
 
-                    if ltp is None:
-                        continue
+            variances.append(round(((ltp - trigger) / trigger) * 100, 2))
+            amounts.append(amount)
 
-                    variance = round(((ltp - trigger) / trigger) * 100, 2)
-                    if variance > threshold:
-                        continue
+        order = np.argsort(np.asarray(variances, dtype=np.float64), kind="stable")
+        index = (np.asarray(variances, dtype=np.float64)[order], np.cumsum(np.asarray(amounts, dtype=np.float64)[order]))
+        self._variance_index_cache = (parsed, quotes, index)
+        return index
 
-                total_amount += details["price"] * details["qty"]
+    def get_total_buy_gtt_amount(self, threshold: float = None) -> float:
+        try:
+            if threshold is None:
+                return round(sum(amount for _, amount in self._active_buy_amounts()), 2)
 
-            return round(total_amount, 2)
+            # Binary search over the variance-sorted running totals instead of rescanning GTTs
+            variances, cumulative_amounts = self._buy_amount_by_variance()
+            count = int(np.searchsorted(variances, threshold, side="right"))
+            return round(float(cumulative_amounts[count - 1]), 2) if count else 0.0
 
         except Exception as e:
             logging.error(f"Error computing total buy GTT amount: {e}")
@@ -187,78 +291,84 @@ class GTTManager:
     # ──────────────── GTT Adjustment ──────────────── #
     def adjust_orders(self, orders: List[Dict], target_variance: float,
                       adjust_fn: Callable[[float, float], tuple[float, float]]) -> List[Dict]:
-        modified = []
-        for order in orders:
-            if order["Variance (%)"] < target_variance:
-                try:
-                    new_trigger = round(order["LTP"] / (1 + target_variance / 100), 2)
-                    new_price, new_trigger = adjust_fn(order_price=new_trigger, ltp=order["LTP"])
-
-                    self.broker.cancel_gtt(order["GTT ID"])
-                    self.broker.place_gtt(
-                        trigger_type=self.broker.GTT_TYPE_SINGLE,
-                        tradingsymbol=order["Symbol"],
-                        exchange=order["Exchange"],
-                        trigger_values=[new_trigger],
-                        last_price=order["LTP"],
-                        orders=[{
-                            "transaction_type": self.broker.TRANSACTION_TYPE_BUY,
-                            "quantity": order["Qty"],
-                            "order_type": self.broker.ORDER_TYPE_LIMIT,
-                            "product": self.broker.PRODUCT_CNC,
-                            "price": new_price
-                        }]
-                    )
-                    modified.append({
-                        "Symbol": order["Symbol"],
-                        "Trigger Price": new_trigger,
-                        "LTP": order["LTP"],
-                        "Variance (%)": round(((order["LTP"] - new_trigger) / new_trigger) * 100, 2)
-                    })
-
-                except Exception as e:
-                    logging.warning(f"Failed to modify GTT for {order['Symbol']}: {e}")
+        def adjust(order):
+            try:
+                new_trigger = round(order["LTP"] / (1 + target_variance / 100), 2)
+                new_price, new_trigger = adjust_fn(order_price=new_trigger, ltp=order["LTP"])
+
+                _with_backoff(self.broker.cancel_gtt, order["GTT ID"])
+                _with_backoff(
+                    self.broker.place_gtt,
+                    trigger_type=self.broker.GTT_TYPE_SINGLE,
+                    tradingsymbol=order["Symbol"],
+                    exchange=order["Exchange"],
+                    trigger_values=[new_trigger],
+                    last_price=order["LTP"],
+                    orders=[{
+                        "transaction_type": self.broker.TRANSACTION_TYPE_BUY,
+                        "quantity": order["Qty"],
+                        "order_type": self.broker.ORDER_TYPE_LIMIT,
+                        "product": self.broker.PRODUCT_CNC,
+                        "price": new_price
+                    }]
+                )
+                return {
+                    "Symbol": order["Symbol"],
+                    "Trigger Price": new_trigger,
+                    "LTP": order["LTP"],
+                    "Variance (%)": round(((order["LTP"] - new_trigger) / new_trigger) * 100, 2)
+                }
+
+            except Exception as e:
+                logging.warning(f"Failed to modify GTT for {order['Symbol']}: {e}")
+                return None
+
+        to_adjust = [order for order in orders if order["Variance (%)"] < target_variance]
+        modified = [result for result in _ORDER_POOL.map(adjust, to_adjust) if result is not None]
         self.session.refresh_gtt_cache()  # ✅ Refresh GTT cache after adjustment
         return modified
 
     # ──────────────── GTT Deletion ──────────────── #
     def delete_orders_above_variance(self, orders: List[Dict], threshold: float) -> List[str]:
-        deleted = []
-        for order in orders:
-            if order["Variance (%)"] > threshold:
-                try:
-                    self.broker.cancel_gtt(order["GTT ID"])
-                    deleted.append(order["Symbol"])
-                except Exception as e:
-                    logging.warning(f"Failed to delete GTT for {order['Symbol']}: {e}")
+        def cancel(order):
+            try:
+                _with_backoff(self.broker.cancel_gtt, order["GTT ID"])
+                return order["Symbol"]
+            except Exception as e:
+                logging.warning(f"Failed to delete GTT for {order['Symbol']}: {e}")
+                return None
+
+        to_delete = [order for order in orders if order["Variance (%)"] > threshold]
+        deleted = [symbol for symbol in _ORDER_POOL.map(cancel, to_delete) if symbol is not None]
         self.session.refresh_gtt_cache()  # ✅ Refresh GTT cache after deletion
         return deleted
 
-    def delete_gtts_for_symbols(self, symbols_to_delete: List[str]) -> List[str]:
-        deleted_symbols = []
+    def delete_gtts_for_symbols(self, symbols_to_delete: Iterable[str]) -> List[str]:
+        deleted_symbols = set()
         try:
-            gtts = self.session.get_gtt_cache()
-            symbols_to_delete_set = set(symbols_to_delete)
-            
-            gtts_to_process = [g for g in gtts if self._parse_gtt(g).get("symbol") in symbols_to_delete_set]
-
-            for g in gtts_to_process:
-                details = self._parse_gtt(g)
+            active_by_symbol = self.get_active_gtts_by_symbol()
+            gtts_to_process = [
+                details
+                for symbol in set(symbols_to_delete)
+                for details in active_by_symbol.get(symbol, ())
+            ]
+
+            def cancel(details):
                 symbol = details.get("symbol")
-                status = details.get("status")
                 gtt_id = details.get("id")
+                try:
+                    _with_backoff(self.broker.cancel_gtt, gtt_id)
+                    logging.debug(f"✅ Deleted existing GTT for {symbol} (ID: {gtt_id})")
+                    return symbol
+                except Exception as e:
+                    logging.warning(f"Failed to delete GTT for {symbol} (ID: {gtt_id}): {e}")
+                    return None
 
-                if status == "active":
-                    try:
-                        self.broker.cancel_gtt(gtt_id)
-                        deleted_symbols.append(symbol)
-                        logging.debug(f"✅ Deleted existing GTT for {symbol} (ID: {gtt_id})")
-                    except Exception as e:
-                        logging.warning(f"Failed to delete GTT for {symbol} (ID: {gtt_id}): {e}")
+            deleted_symbols = {symbol for symbol in _ORDER_POOL.map(cancel, gtts_to_process) if symbol is not None}
 
             if deleted_symbols:
                 self.session.refresh_gtt_cache()
                 
         except Exception as e:
             logging.error(f"Error deleting GTTs for symbols: {e}")
-        return list(set(deleted_symbols))
+        return list(deleted_symbols)
@@ -1,11 +1,22 @@
 import os
 import pandas as pd
 import logging
+import threading
 from datetime import datetime
 from typing import List, Dict
 
 from core.utils import read_csv, write_csv
 
+def format_trend(row: Dict) -> Dict:
+    """
+    Puts "Trend" into display form, e.g. "UP(5)". Rows without trend history
+    render as "-(None)", as the CLI and API always have.
+    """
+    trend_days = row["Trend Days"]
+    if trend_days != "":
+        row["Trend"] = row["Trend"] + "(" + str(trend_days) + ")"
+    return row
+
 class HoldingsAnalyzer:
     def __init__(self, user_id: str, broker_name: str):
         self.user_id = user_id
@@ -56,10 +67,8 @@ class HoldingsAnalyzer:
             ]]
 
             if os.path.exists(self.tradebook_path):
-                existing_df = pd.read_csv(self.tradebook_path)
-                existing_ids = set(existing_df["trade_id"].astype(str))
+                existing_ids = set(pd.read_csv(self.tradebook_path, usecols=["trade_id"])["trade_id"].astype(str))
             else:
-                existing_df = pd.DataFrame(columns=new_df.columns)
                 existing_ids = set()
 
             initial_count = len(new_df)
@@ -67,8 +76,9 @@ class HoldingsAnalyzer:
             result_summary["duplicates_skipped"] = initial_count - len(new_df)
 
             if not new_df.empty:
-                updated_df = pd.concat([existing_df, new_df], ignore_index=True)
-                updated_df.to_csv(self.tradebook_path, index=False)
+                # Only the new trades are written; the existing tradebook is appended to, not rewritten
+                if not write_csv(self.tradebook_path, new_df.to_dict(orient="records"), append=True):
+                    raise IOError(f"Could not write tradebook {self.tradebook_path}")
                 result_summary["records_uploaded"] = len(new_df)
                 logging.info(f"Appended {len(new_df)} new trades to the tradebook: {self.tradebook_path}")
             else:
@@ -133,84 +143,163 @@ class HoldingsAnalyzer:
         df_combined.drop_duplicates(subset=["Date", "Symbol"], keep="last", inplace=True)
         logging.debug(f"Records after dropping duplicates: {len(df_combined)}")
         
-        df_combined.to_csv(self.roi_path, index=False)
+        # Write then rename, so a concurrent reader never sees a half-written file
+        tmp_path = f"{self.roi_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        df_combined.to_csv(tmp_path, index=False)
+        os.replace(tmp_path, self.roi_path)
         logging.info(f"ROI results written to {self.roi_path}")
 
     # ──────────────── Holdings Analysis ──────────────── #
-    def analyze_symbol_trend(self, symbol: str, threshold=0.002):
+    def load_roi_history(self) -> Dict[str, list]:
         """
-        Analyze the trend (uptrend or downtrend) for a given symbol in roi-master.csv.
-        Returns ("UP", n), ("DOWN", n), or ("FLAT", 1) where n is the number of days the trend has continued.
-        Small fluctuations within the threshold are ignored.
+        Reads roi-master.csv once and returns each symbol's "ROI per day" values
+        in date order, keyed by upper-cased symbol.
         """
         try:
-            import pandas as pd
             if not os.path.exists(self.roi_path):
-                return None
+                return {}
 
             df = pd.read_csv(self.roi_path)
-            df = df[df["Symbol"].str.upper() == symbol.upper()]
-            if df.empty or len(df) < 2:
-                return None
-
             df["Date"] = pd.to_datetime(df["Date"], errors='coerce')
-            df = df.sort_values("Date", ascending=True)
-            roi_series = df["ROI per day"].values
-
-            trend = None
-            count = 1
-
-            for i in range(len(roi_series) - 1, 0, -1):
-                today = roi_series[i]
-                prev = roi_series[i - 1]
-                diff = today - prev
-
-                if trend is None:
-                    if abs(diff) <= threshold:
-                        return "FLAT", 1
-                    trend = "UP" if diff > 0 else "DOWN"
-                    count = 1
-                else:
-                    if trend == "UP" and diff > threshold:
-                        count += 1
-                    elif trend == "DOWN" and diff < -threshold:
-                        count += 1
-                    else:
-                        break
-
-            return trend, count
+            df = df.sort_values("Date", ascending=True, kind="stable")
+            return {
+                symbol: group["ROI per day"].tolist()
+                for symbol, group in df.groupby(df["Symbol"].str.upper(), sort=False)
+            }
 
         except Exception as e:
-            print(f"Error analyzing symbol trend: {e}")
+            print(f"Error reading ROI history: {e}")
+            return {}
+
+    def analyze_symbol_trend(self, symbol: str, threshold=0.002, roi_history: Dict[str, list] = None):
+        """
+        Analyze the trend (uptrend or downtrend) for a given symbol in roi-master.csv.
+        Returns ("UP", n), ("DOWN", n), or ("FLAT", 1) where n is the number of days the trend has continued.
+        Small fluctuations within the threshold are ignored. Pass `roi_history` from
+        `load_roi_history` to avoid re-reading the file for every symbol.
+        """
+        if roi_history is None:
+            roi_history = self.load_roi_history()
+        roi_series = roi_history.get(symbol.upper(), ())
+        if len(roi_series) < 2:
             return None
 
+        trend = None
+        count = 1
+
+        for i in range(len(roi_series) - 1, 0, -1):
+            today = roi_series[i]
+            prev = roi_series[i - 1]
+            diff = today - prev
+
+            if trend is None:
+                if abs(diff) <= threshold:
+                    return "FLAT", 1
+                trend = "UP" if diff > 0 else "DOWN"
+                count = 1
+            else:
+                if trend == "UP" and diff > threshold:
+                    count += 1
+                elif trend == "DOWN" and diff < -threshold:
+                    count += 1
+                else:
+                    break
+
+        return trend, count
+
 
     def apply_filters(self, results: List[Dict], filters: Dict) -> List[Dict]:
         if not filters:
             return results
-        filtered = []
-        for r in results:
-            match = True
-            for key, val in filters.items():
-                if key not in r:
-                    match = False
-                    break
-                if isinstance(val, (int, float)):
-                    if r[key] < val:
-                        match = False
-                        break
-                elif isinstance(val, str):
-                    if str(r[key]).lower() != val.lower():
-                        match = False
-                        break
-            if match:
-                filtered.append(r)
-        return filtered
+        return [r for r in results if self._matches_filters(r, filters)]
+
+    @staticmethod
+    def _matches_filters(r: Dict, filters: Dict) -> bool:
+        for key, val in filters.items():
+            if key not in r:
+                return False
+            if isinstance(val, (int, float)):
+                if r[key] < val:
+                    return False
+            elif isinstance(val, str):
+                if str(r[key]).lower() != val.lower():
+                    return False
+        return True
 
     def get_total_invested(self, holdings: List[Dict]) -> float:
         return sum(h["quantity"] * h["average_price"] for h in holdings if h["quantity"] > 0 and h["average_price"] > 0)
 
-    def analyze_holdings(self, broker, cmp_manager, filters=None, sort_by="ROI/Day") -> List[Dict]:
+    def _analyze_holding(self, holding: Dict, cmp_manager, trades_by_symbol: Dict, roi_history: Dict, quality_map: Dict, total_invested: float):
+        symbol = holding["tradingsymbol"]
+        symbol_clean = symbol.replace("#", "").replace("-BE", "").upper()
+        quantity = holding["quantity"] + holding.get("t1_quantity", 0)
+        avg_price = holding["average_price"]
+        invested = quantity * avg_price
+        quality = quality_map.get(symbol_clean, "-")
+
+        ltp = holding["last_price"]
+        if not ltp:
+            ltp = cmp_manager.get_cmp(holding.get("exchange", "NSE"), symbol)
+        if not ltp:
+            logging.warning(f"LTP not found for {symbol}. Skipping.")
+            return None
+
+        current_value = quantity * ltp
+        pnl = current_value - invested
+        pnl_pct = (pnl / invested * 100) if invested else 0
+        roi = pnl_pct
+
+        qty_needed = quantity
+        weighted_sum = 0
+        total_qty = 0
+
+        # Newest buys first
+        for trade_qty, trade_date in trades_by_symbol.get(symbol_clean, ()):
+            if qty_needed <= 0:
+                break
+            if pd.isna(trade_date):
+                logging.warning(f"Skipping {symbol} trade with invalid date (quantity {trade_qty})")
+                continue
+            trade_date = trade_date.date()
+            used_qty = min(qty_needed, trade_qty)
+            weighted_sum += used_qty * trade_date.toordinal()
+            total_qty += used_qty
+            qty_needed -= used_qty
+
+        if total_qty > 0:
+            avg_date_ordinal = weighted_sum / total_qty
+            avg_date = datetime.fromordinal(int(avg_date_ordinal)).date()
+            days_held = (datetime.today().date() - avg_date).days
+        else:
+            days_held = 0
+
+        yld_per_day = (pnl / days_held) if days_held > 0 else 0
+        roi_per_day = (roi / days_held) if days_held > 0 else 0
+        weighted_roi = (roi_per_day * invested / total_invested) if total_invested > 0 else 0
+
+        trend_result = self.analyze_symbol_trend(symbol, roi_history=roi_history)
+        trend_str = trend_result[0] if trend_result else "-"
+        trend_days = trend_result[1] if trend_result else None
+
+        return {
+            "Symbol": symbol,
+            "Invested": round(invested, 1),
+            "P&L": round(pnl, 1),
+            "Yld/Day": round(yld_per_day, 1),
+            "Age": days_held,
+            "P&L%": round(pnl_pct, 2),
+            "ROI/Day": round(roi_per_day, 2),
+            "W ROI": round(weighted_roi, 4),
+            "Trend": trend_str,
+            "Trend Days": trend_days,
+            "Quality": quality
+        }
+
+    def analyze_holdings(self, broker, cmp_manager, filters=None, sort_by="ROI/Day", render_trend=False) -> List[Dict]:
+        """
+        Analyzes every holding and returns the rows that pass `filters`, sorted by `sort_by`.
+        With `render_trend`, "Trend" is returned in display form, e.g. "UP(5)".
+        """
         logging.debug("Analyzing holdings...")
         if filters is None:
             filters = {}
@@ -222,84 +311,35 @@ class HoldingsAnalyzer:
         trades_df.columns = [col.strip().lower().replace(" ", "_") for col in trades_df.columns]
         trades_df["trade_date"] = pd.to_datetime(trades_df["trade_date"], errors='coerce')
         trades_df = trades_df[trades_df["trade_type"].str.lower() == "buy"]
+        # Group buys by symbol once, newest first, instead of filtering the whole tradebook per holding
+        trades_df = trades_df.sort_values(by="trade_date", ascending=False, kind="stable")
+        trades_by_symbol = {
+            symbol: list(zip(group["quantity"].tolist(), group["trade_date"].tolist()))
+            for symbol, group in trades_df.groupby(trades_df["symbol"].str.upper(), sort=False)
+        }
 
         holdings = broker.get_holdings()
         logging.debug(f"Found {len(holdings)} holdings.")
-        results = []
         total_invested = self.get_total_invested(holdings)
 
+        roi_history = self.load_roi_history()
+
+        # Rows are filtered and their Trend rendered as they are built, in a single pass
+        results = []
+        generated = 0
         for holding in holdings:
-            symbol = holding["tradingsymbol"]
-            symbol_clean = symbol.replace("#", "").replace("-BE", "").upper()
-            quantity = holding["quantity"] + holding.get("t1_quantity", 0)
-            avg_price = holding["average_price"]
-            invested = quantity * avg_price
-            quality = quality_map.get(symbol_clean, "-")
-
-            ltp = holding["last_price"]
-            if not ltp:
-                ltp = cmp_manager.get_cmp(holding.get("exchange", "NSE"), symbol)
-            if not ltp:
-                logging.warning(f"LTP not found for {symbol}. Skipping.")
+            row = self._analyze_holding(holding, cmp_manager, trades_by_symbol, roi_history, quality_map, total_invested)
+            if row is None:
                 continue
+            generated += 1
+            # Filters match the bare trend ("UP"), so they run before rendering "UP(5)"
+            if filters and not self._matches_filters(row, filters):
+                continue
+            if render_trend:
+                format_trend(row)
+            results.append(row)
 
-            current_value = quantity * ltp
-            pnl = current_value - invested
-            pnl_pct = (pnl / invested * 100) if invested else 0
-            roi = pnl_pct
-
-            symbol_trades = trades_df[trades_df["symbol"].str.upper() == symbol_clean]
-            symbol_trades = symbol_trades.sort_values(by="trade_date", ascending=False)
-
-            qty_needed = quantity
-            weighted_sum = 0
-            total_qty = 0
-
-            for _, trade in symbol_trades.iterrows():
-                if qty_needed <= 0:
-                    break
-                trade_qty = trade["quantity"]
-                trade_date = trade["trade_date"]
-                if pd.isna(trade_date):
-                    logging.warning(f"Skipping trade with invalid date: {trade.to_dict()}")
-                    continue
-                trade_date = trade_date.date()
-                used_qty = min(qty_needed, trade_qty)
-                weighted_sum += used_qty * trade_date.toordinal()
-                total_qty += used_qty
-                qty_needed -= used_qty
-
-            if total_qty > 0:
-                avg_date_ordinal = weighted_sum / total_qty
-                avg_date = datetime.fromordinal(int(avg_date_ordinal)).date()
-                days_held = (datetime.today().date() - avg_date).days
-            else:
-                days_held = 0
-
-            yld_per_day = (pnl / days_held) if days_held > 0 else 0
-            roi_per_day = (roi / days_held) if days_held > 0 else 0
-            weighted_roi = (roi_per_day * invested / total_invested) if total_invested > 0 else 0
-
-            trend_result = self.analyze_symbol_trend(symbol)
-            trend_str = trend_result[0] if trend_result else "-"
-            trend_days = trend_result[1] if trend_result else None
-
-            results.append({
-                "Symbol": symbol,
-                "Invested": round(invested, 1),
-                "P&L": round(pnl, 1),
-                "Yld/Day": round(yld_per_day, 1),
-                "Age": days_held,
-                "P&L%": round(pnl_pct, 2),
-                "ROI/Day": round(roi_per_day, 2),
-                "W ROI": round(weighted_roi, 4),
-                "Trend": trend_str,
-                "Trend Days": trend_days,
-                "Quality": quality
-            })
-
-        logging.debug(f"Generated {len(results)} results before filtering.")
-        results = self.apply_filters(results, filters)
+        logging.debug(f"Generated {generated} results before filtering.")
         logging.debug(f"Found {len(results)} results after applying filters.")
         
         sort_key_mapping = {"roi_per_day": "ROI/Day", "weighted_roi": "W ROI"}
@@ -309,7 +349,7 @@ class HoldingsAnalyzer:
         logging.debug(f"Sorted results by {sort_key}.")
         
         self.write_roi_results(sorted_results)
-        
+
         return sorted_results
 
     def download_historical_trades(self, broker, start_date, end_date):
@@ -27,3 +27,10 @@ class GTTOrder:
     price: float
     status: str
     type: str
+
+@dataclass(frozen=True)
+class SessionSnapshot:
+    holdings: list
+    entry_levels: list
+    gtt_cache: list
+    cmp_manager: object
@@ -7,6 +7,9 @@ from core.entry import BaseEntryStrategy
 class MultiLevelEntryStrategy(BaseEntryStrategy):
     LTP_TRIGGER_VARIANCE_PERCENT = 0.15  # 15% configurable value
     ORDER_PRICE_BUFFER_PERCENT = 0.025  # 2.5% buffer
+    TRACE_SYMBOL = "AFIL"  # Symbol whose planning decisions are logged step by step
+    # (level name, entry price column, validity flag set by identify_candidates)
+    ENTRY_LEVELS = (("E1", "entry1", "is_entry1_valid"), ("E2", "entry2", "is_entry2_valid"), ("E3", "entry3", "is_entry3_valid"))
 
     def __init__(self, broker, cmp_manager, holdings, entry_levels, gtt_cache):
         super().__init__(broker, cmp_manager, holdings)
@@ -34,7 +37,8 @@ class MultiLevelEntryStrategy(BaseEntryStrategy):
     def identify_candidates(self) -> List[Dict]:
         candidates = []
         existing_gtt_symbols = set()
-        gtt_orders = self.broker.get_gtt_orders() # Get standardized GTTOrder objects
+        # The session's GTT cache holds the same standardized GTTs; only hit the broker when none was given
+        gtt_orders = self.gtt_cache if self.gtt_cache is not None else self.broker.get_gtt_orders()
         for gtt_order in gtt_orders:
             # The transaction_type is nested within the 'orders' list
             if gtt_order.get('orders') and len(gtt_order['orders']) > 0:
@@ -54,33 +58,41 @@ class MultiLevelEntryStrategy(BaseEntryStrategy):
                 #if trade.get('transaction_type') == 'BUY':
                     completed_trade_symbols.add(trade.get('tradingsymbol').upper())
 
+        # Symbols already handled; repeated entry-level rows are reported by detect_duplicates, only the first is planned
+        seen_symbols = set()
         for scrip in self.entry_levels:
             symbol = scrip.get("symbol")
             if not symbol:
                 continue
-            
-            if symbol == "AFIL":
+            trace = symbol == self.TRACE_SYMBOL
+            if trace:
                 logging.debug(f"--- Identifying LEHAR ---")
                 logging.debug(f"  Scrip: {scrip}")
 
             exchange = scrip.get("exchange", "NSE")
+            symbol_upper = symbol.upper()
+
+            if symbol_upper in seen_symbols:
+                self.skipped_orders.append(self._create_skipped_order(symbol, "Duplicate entry level row for symbol", exchange=exchange))
+                continue
+            seen_symbols.add(symbol_upper)
 
             # 1. Check for existing GTT order
-            if symbol.upper() in existing_gtt_symbols:
-                if symbol == "AFIL":
+            if symbol_upper in existing_gtt_symbols:
+                if trace:
                     logging.debug(f"  Skipping LEHAR: GTT already exists.")
                 self.skipped_orders.append(self._create_skipped_order(symbol, "GTT already exists for symbol", exchange=exchange))
                 continue
             
             # 2. Check for completed trade on the same day
-            if symbol.upper() in completed_trade_symbols:
+            if symbol_upper in completed_trade_symbols:
                 self.skipped_orders.append(self._create_skipped_order(symbol, "Trade already completed today", exchange=exchange))
                 continue
 
             # 3. Check for valid allocation
             allocated = scrip.get("Allocated")
             if allocated is None or (isinstance(allocated, float) and math.isnan(allocated)) or allocated == 0:
-                if symbol == "AFIL":
+                if trace:
                     logging.debug(f"  Skipping LEHAR: Invalid or zero allocation ({allocated}).")
                 self.skipped_orders.append(self._create_skipped_order(symbol, "Invalid or zero allocation", exchange=exchange))
                 continue
@@ -95,7 +107,7 @@ class MultiLevelEntryStrategy(BaseEntryStrategy):
             num_entries = (1 if is_entry1_valid else 0) + (1 if is_entry2_valid else 0) + (1 if is_entry3_valid else 0)
 
             if num_entries == 0:
-                if symbol == "AFIL":
+                if trace:
                     logging.debug(f"  Skipping LEHAR: No valid entry levels.")
                 self.skipped_orders.append(self._create_skipped_order(symbol, "No valid entry levels", exchange=exchange))
                 continue
@@ -103,13 +115,13 @@ class MultiLevelEntryStrategy(BaseEntryStrategy):
             # 5. Fetch and validate LTP (done last to save API calls)
             ltp = self.cmp_manager.get_cmp(exchange, symbol)
             if ltp is None or ltp == 0 or (isinstance(ltp, float) and math.isnan(ltp)):
-                if symbol == "AFIL":
+                if trace:
                     logging.debug(f"  Skipping LEHAR: Invalid CMP ({ltp}).")
                 self.skipped_orders.append(self._create_skipped_order(symbol, "Invalid CMP", exchange=exchange))
                 continue
             
             # If all checks pass, add to candidates
-            if symbol == "AFIL":
+            if trace:
                 logging.debug(f"  LEHAR added to candidates.")
             candidate_scrip = scrip.copy()
             candidate_scrip['ltp'] = ltp
@@ -135,38 +147,27 @@ class MultiLevelEntryStrategy(BaseEntryStrategy):
         allocated = scrip["Allocated"]
         entry_allocated = allocated / num_entries if num_entries > 0 else 0
 
-        entry_level_definitions = [
-            {'level': 'E1', 'price': scrip.get("entry1"), 'is_valid': scrip['is_entry1_valid'], 'max_investment': entry_allocated},
-            {'level': 'E2', 'price': scrip.get("entry2"), 'is_valid': scrip['is_entry2_valid'], 'max_investment': 2 * entry_allocated},
-            {'level': 'E3', 'price': scrip.get("entry3"), 'is_valid': scrip['is_entry3_valid'], 'max_investment': allocated}
-        ]
-
-        # Levels where LTP is already low enough to buy
-        potential_levels = []
-        for i, level_info in enumerate(entry_level_definitions):
-            if level_info['is_valid'] and self._is_valid_price(level_info['price']) and ltp <= level_info['price']:
+        # Valid levels still below their investment cap, in E1..E3 order
+        open_levels = []
+        for i, (level, price_key, valid_key) in enumerate(self.ENTRY_LEVELS):
+            price = scrip.get(price_key)
+            if scrip[valid_key] and self._is_valid_price(price):
                 current_level_max_investment = (i + 1) * entry_allocated
                 if i + 1 == num_entries: # Last level
                     current_level_max_investment = allocated
-                
+
                 if invested_amount < current_level_max_investment:
-                    potential_levels.append((level_info, current_level_max_investment))
-        
+                    open_levels.append((level, price, current_level_max_investment))
+
+        # Levels where LTP is already low enough to buy
+        potential_levels = [entry for entry in open_levels if ltp <= entry[1]]
         if potential_levels:
             # If there are levels ready for immediate buy, choose the one with the lowest price (best value)
-            best_level, best_max_investment = min(potential_levels, key=lambda x: x[0]['price'])
-            return best_level['level'], best_level['price'], best_max_investment
+            return min(potential_levels, key=lambda x: x[1])
 
-        # If LTP is higher than all entry prices, find the next target for a GTT order
-        for i, level_info in enumerate(entry_level_definitions):
-            if level_info['is_valid'] and self._is_valid_price(level_info['price']):
-                current_level_max_investment = (i + 1) * entry_allocated
-                if i + 1 == num_entries: # Last level
-                    current_level_max_investment = allocated
-
-                if invested_amount < current_level_max_investment:
-                    # This is the next level to aim for with a GTT order.
-                    return level_info['level'], level_info['price'], current_level_max_investment
+        # If LTP is higher than all entry prices, the next open level is the target for a GTT order
+        if open_levels:
+            return open_levels[0]
 
         # If we are here, it means we have invested in all valid levels
         return None, None, 0
@@ -186,59 +187,60 @@ class MultiLevelEntryStrategy(BaseEntryStrategy):
             exchange = scrip["exchange"]
             ltp = scrip["ltp"]
             allocated = scrip["Allocated"]
+            trace = symbol == self.TRACE_SYMBOL
 
             # Add logging for LEHAR
-            if symbol == "AFIL":
+            if trace:
                 logging.debug(f"--- Processing LEHAR ---")
                 logging.debug(f"  Scrip: {scrip}")
 
             total_qty, average_price = self._get_holding_details(holdings_map, symbol)
             invested_amount = total_qty * average_price
 
-            if symbol == "AFIL":
+            if trace:
                 logging.debug(f"  Holdings - Total Qty: {total_qty}, Avg Price: {average_price}, LTP: {ltp} ")
                 logging.debug(f"  Calculated Invested Amount: {invested_amount}")
                 logging.debug(f"  Allocated Amount: {allocated}")
 
             if invested_amount >= allocated:
-                if symbol == "AFIL":
+                if trace:
                     logging.warning(f"  Skipping LEHAR: Invested amount ({invested_amount}) >= Allocated amount ({allocated})")
                 self.skipped_orders.append(self._create_skipped_order(symbol, "Holding has reached or exceeded allocated amount", exchange, ltp))
                 continue
 
             entry_level, entry_price, target_investment = self._determine_entry_level(scrip, invested_amount, ltp)
 
-            if symbol == "AFIL":
+            if trace:
                 logging.debug(f"  Determined Entry Level: {entry_level}, Entry Price: {entry_price}, Target Investment: {target_investment}")
 
             if not entry_level:
-                if symbol == "AFIL":
+                if trace:
                     logging.debug(f"  Skipping LEHAR: Does not qualify for any entry level.")
                 self.skipped_orders.append(self._create_skipped_order(symbol, "Holding does not qualify for any entry level", exchange, ltp))
                 continue
 
             if not self._is_valid_price(entry_price):
-                if symbol == "AFIL":
+                if trace:
                     logging.debug(f"  Skipping LEHAR: Invalid entry price ({entry_price}).")
                 self.skipped_orders.append(self._create_skipped_order(symbol, "Invalid entry price for quantity calculation", exchange, ltp, entry_level))
                 continue
 
             amount_to_invest = min(target_investment - invested_amount, allocated - invested_amount)
-            if symbol == "AFIL":
+            if trace:
                 logging.debug(f"  Amount to Invest: {amount_to_invest}")
 
             if amount_to_invest <= 0:
-                if symbol == "AFIL":
+                if trace:
                     logging.debug(f"  Skipping LEHAR: Amount to invest is not positive ({amount_to_invest}).")
                 self.skipped_orders.append(self._create_skipped_order(symbol, "No further investment needed for this level", exchange, ltp, entry_level))
                 continue
 
             qty = self._calculate_quantity(amount_to_invest, entry_price)
-            if symbol == "AFIL":
+            if trace:
                 logging.debug(f"  Calculated Quantity: {qty}")
 
             if qty == 0:
-                if symbol == "AFIL":
+                if trace:
                     logging.error(f"  Skipping LEHAR: Computed quantity is 0.")
                 self.skipped_orders.append(self._create_skipped_order(symbol, "Computed quantity is 0", exchange, ltp, entry_level))
                 continue
@@ -248,13 +250,13 @@ class MultiLevelEntryStrategy(BaseEntryStrategy):
 
             variance = abs(ltp - trigger) / trigger if trigger > 0 else 0
             if variance > self.LTP_TRIGGER_VARIANCE_PERCENT:
-                if symbol == "AFIL":
+                if trace:
                     logging.debug(f"  Skipping LEHAR: LTP-trigger variance of {variance:.1%} exceeds threshold.")
                 reason = f"LTP-trigger variance of {variance:.1%} exceeds threshold of {self.LTP_TRIGGER_VARIANCE_PERCENT:.1%}"
                 self.skipped_orders.append(self._create_skipped_order(symbol, reason, exchange, ltp, entry_level))
                 continue
 
-            if symbol == "AFIL":
+            if trace:
                 logging.debug(f"  LEHAR successfully added to plan.")
 
             final_plan.append({
@@ -1,15 +1,29 @@
 # core/session.py
 
 import time
-import json
 import os
+import sys
+import json
+import hashlib
 import logging
+import threading
+import orjson
+from concurrent.futures import ThreadPoolExecutor
 from core.cmp import CMPManager
+from core.gtt_manage import GTTManager
+from core.models import SessionSnapshot
 from core.utils import read_csv
 
+# Holdings, entry levels and GTTs come from independent sources, so refresh_all_caches
+# fetches them side by side. Shared across refreshes to avoid per-call thread start-up.
+_REFRESH_POOL = ThreadPoolExecutor(max_workers=3, thread_name_prefix="session-refresh")
+
+GTT_PLAN_WRITE_BUFFER_SIZE = 1 << 16
 
 class SessionCache:
     GTT_PLAN_CACHE_PATH = "data/gtt_plan_cache.json"
+    # Sub-caches refreshed less than this many seconds ago are reused by refresh_all_caches
+    MIN_REFRESH_INTERVAL = float(os.getenv("SESSION_MIN_REFRESH_INTERVAL", "2.0"))
 
     def __init__(self, session_manager, ttl: int = 300):
         self.ttl = ttl
@@ -21,11 +35,36 @@ class SessionCache:
         self.gtt_symbols = set()
         self.cmp_manager = None # Initialize lazily
         self.gtt_cache = []
+        self._last_refresh = {"holdings": 0.0, "entry_levels": 0.0, "gtt": 0.0, "cmp": 0.0}
+        self._digests = {}  # sub-cache name -> (cached object it was computed from, digest)
+        self._refresh_lock = threading.RLock()
+        self._gtt_manager = None
+        # (blake2b digest, file mtime) of the last GTT plan this session wrote
+        self._gtt_plan_written = (None, None)
 
     def is_stale(self) -> bool:
         return (time.time() - self.last_refreshed) > self.ttl
 
-    def refresh_all_caches(self):
+    def _is_due(self, name: str, now: float, max_age: float) -> bool:
+        return now - self._last_refresh[name] >= max_age
+
+    def _mark_refreshed(self, name: str):
+        self._last_refresh[name] = time.monotonic()
+        self._digests.pop(name, None)
+
+    def refresh_all_caches(self, force: bool = False, max_age: float = None):
+        """
+        Refreshes holdings, entry levels, GTTs and CMPs. Unless `force` is set,
+        a sub-cache refreshed within `max_age` seconds (MIN_REFRESH_INTERVAL by
+        default) is kept as is. Concurrent callers are serialized, so a burst of
+        requests triggers one refresh and the callers queued behind it find the caches fresh.
+        """
+        if max_age is None:
+            max_age = self.MIN_REFRESH_INTERVAL
+        with self._refresh_lock:
+            self._refresh_all_caches(force, max_age)
+
+    def _refresh_all_caches(self, force: bool, max_age: float):
         if not self.broker:
             print("Broker not initialized. Please login first.")
             return
@@ -34,18 +73,37 @@ class SessionCache:
             self.cmp_manager = CMPManager(csv_path="data/Name-symbol-mapping.csv", broker=self.broker, session_manager=self.session_manager, ttl=self.ttl)
 
         #print("🔄 Refreshing all caches...")
-        self.refresh_holdings()
-        self.refresh_entry_levels()
-        self.refresh_gtt_cache()
-        self.refresh_cmp_cache()
+        now = time.monotonic()
+        futures = [
+            _REFRESH_POOL.submit(refresh)
+            for name, refresh in (("holdings", self.refresh_holdings), ("entry_levels", self.refresh_entry_levels), ("gtt", self.refresh_gtt_cache))
+            if force or self._is_due(name, now, max_age)
+        ]
+        for future in futures:
+            future.result()
+        refreshed = bool(futures)
+        # CMPs are fetched for the symbols in the other caches, so they follow any of them
+        if force or refreshed or self._is_due("cmp", now, max_age):
+            self.refresh_cmp_cache()
         self.last_refreshed = time.time()
 
     def refresh_holdings(self):
         self.holdings = self.broker.get_holdings()
+        self._mark_refreshed("holdings")
 
     def refresh_entry_levels(self):
+        """
+        Reloads entry levels. Every cached row's "symbol" is stripped, upper-cased
+        and interned here, so consumers can compare and hash symbols as-is.
+        """
         # Assuming entry levels are broker specific
-        self.entry_levels = self.broker.load_entry_levels(f"data/{self.broker.user_id}-{self.broker.broker_name}-entry-levels.csv")
+        entry_levels = self.broker.load_entry_levels(f"data/{self.broker.user_id}-{self.broker.broker_name}-entry-levels.csv")
+        for row in entry_levels:
+            symbol = row.get("symbol")
+            if isinstance(symbol, str):
+                row["symbol"] = sys.intern(symbol.strip().upper())
+        self.entry_levels = entry_levels
+        self._mark_refreshed("entry_levels")
 
     def refresh_gtt_cache(self):
         try:
@@ -53,10 +111,52 @@ class SessionCache:
         except Exception as e:
             print(f"❌ Failed to refresh GTT cache: {e}")
             self.gtt_cache = []
-
+        self._mark_refreshed("gtt")
 
     def refresh_cmp_cache(self):
             self.cmp_manager.refresh_cache(self.holdings, self.gtt_cache, self.entry_levels)
+            self._mark_refreshed("cmp")
+
+    def _digest_source(self, name: str):
+        if name == "entry_levels":
+            return self.entry_levels
+        if name == "gtt":
+            return self.gtt_cache
+        if name == "cmp":
+            return self.cmp_manager.cache if self.cmp_manager else None
+        raise ValueError(f"No digest for cache '{name}'")
+
+    def cache_digest(self, *names: str) -> str:
+        """
+        Returns a 64-bit blake2b hex digest of the named sub-caches
+        ("entry_levels", "gtt", "cmp"). It changes only when their contents do,
+        so it can serve as an HTTP ETag.
+        """
+        h = hashlib.blake2b(digest_size=8)
+        for name in names:
+            # Refreshes replace the cached objects, so a digest is only reused for the
+            # object it was computed from; one stored late by a thread still hashing
+            # pre-refresh data is never served for the new data
+            source = self._digest_source(name)
+            cached = self._digests.get(name)
+            if cached is not None and cached[0] is source:
+                digest = cached[1]
+            else:
+                snapshot = list(source.items()) if isinstance(source, dict) else source or []
+                data = orjson.dumps(snapshot, option=orjson.OPT_SERIALIZE_NUMPY, default=str)
+                digest = hashlib.blake2b(data, digest_size=8).digest()
+                self._digests[name] = (source, digest)
+            h.update(digest)
+        return h.hexdigest()
+
+    def snapshot(self) -> SessionSnapshot:
+        """
+        Returns holdings, entry levels, GTTs and the CMP manager together, after a
+        single staleness check, instead of one check and possible refresh per getter.
+        """
+        if self.is_stale():
+            self.refresh_all_caches()
+        return SessionSnapshot(self.holdings, self.entry_levels, self.gtt_cache, self.cmp_manager)
 
     def get_gtt_cache(self):
         if self.is_stale():
@@ -87,22 +187,54 @@ class SessionCache:
         if self.is_stale():
             self.refresh_all_caches()
         return self.cmp_manager
+
+    def get_gtt_manager(self) -> GTTManager:
+        """
+        Returns the GTTManager for the current broker and CMP manager, so callers
+        share its parsed GTTs and variance analysis. It is rebuilt when either
+        changes, and the previous broker is not kept alive.
+        """
+        cmp_manager = self.get_cmp_manager()
+        manager = self._gtt_manager
+        if manager is None or manager.broker is not self.broker or manager.cmp_manager is not cmp_manager:
+            manager = self._gtt_manager = GTTManager(self.broker, cmp_manager, self)
+        return manager
     # ──────────────── GTT Plan Cache ──────────────── #
     def write_gtt_plan(self, orders: list):
+        """
+        Writes the plan with orjson. The write is skipped when the file still holds
+        exactly what this session last wrote, e.g. when the same plan is regenerated.
+        """
         os.makedirs(os.path.dirname(self.GTT_PLAN_CACHE_PATH), exist_ok=True)
         try:
-            with open(self.GTT_PLAN_CACHE_PATH, "w") as f:
-                json.dump(orders, f, indent=2)
+            payload = orjson.dumps(orders, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY)
+            digest = hashlib.blake2b(payload, digest_size=8).digest()
+            if self._gtt_plan_written == (digest, self._gtt_plan_mtime()):
+                return
+            with open(self.GTT_PLAN_CACHE_PATH, "wb", buffering=GTT_PLAN_WRITE_BUFFER_SIZE) as f:
+                f.write(payload)
+            self._gtt_plan_written = (digest, self._gtt_plan_mtime())
         except Exception as e:
             logging.error(f"❌ Failed to write GTT plan cache: {e}")
 
+    def _gtt_plan_mtime(self):
+        try:
+            return os.stat(self.GTT_PLAN_CACHE_PATH).st_mtime_ns
+        except OSError:
+            return None
+
     def read_gtt_plan(self) -> list:
         if not os.path.exists(self.GTT_PLAN_CACHE_PATH):
             return []
         try:
             logging.debug("📂 Reading GTT plan from cache: ")  
-            with open(self.GTT_PLAN_CACHE_PATH, "r") as f:
-                return json.load(f)
+            with open(self.GTT_PLAN_CACHE_PATH, "rb") as f:
+                data = f.read()
+            try:
+                return orjson.loads(data)
+            except orjson.JSONDecodeError:
+                # Plans written by the earlier json.dump code may hold NaN/Infinity, which orjson rejects
+                return json.loads(data)
         except Exception as e:
             logging.error(f"❌ Failed to read GTT plan cache: {e}")
             return []
@@ -3,6 +3,7 @@ import os
 import pickle
 import requests
 import webbrowser
+import threading
 from urllib.parse import urlparse, parse_qs
 from dotenv import load_dotenv
 from kiteconnect import KiteConnect, exceptions
@@ -27,6 +28,9 @@ class SessionManager:
         os.makedirs(os.path.dirname(self.kite_token_file), exist_ok=True)
         os.makedirs(os.path.dirname(self.upstox_token_file), exist_ok=True)
 
+        self._kite = None
+        self._kite_lock = threading.Lock()
+
     # ──────────────── Token Persistence ──────────────── #
     def save_token(self, token: str, token_file: str):
         with open(token_file, "wb") as f:
@@ -39,6 +43,18 @@ class SessionManager:
         return None
 
     # ──────────────── Zerodha (Kite) ──────────────── #
+    def get_kite_client(self) -> KiteConnect:
+        """
+        Returns the KiteConnect client used for login and token checks. It is
+        created once so repeated validations reuse its kept-alive connection.
+        """
+        if self._kite is None:
+            # API handlers call this from worker threads; only one of them may build the client
+            with self._kite_lock:
+                if self._kite is None:
+                    self._kite = KiteConnect(api_key=self.kite_api_key)
+        return self._kite
+
     def generate_new_kite_token(self, kite: KiteConnect, redirected_url: str = None) -> str:
         if not redirected_url:
             login_url = kite.login_url()
@@ -58,7 +74,7 @@ class SessionManager:
 
     def get_valid_kite_access_token(self) -> str:
         """For interactive CLI use. Ensures a valid token exists, or triggers a new login."""
-        kite = KiteConnect(api_key=self.kite_api_key)
+        kite = self.get_kite_client()
         is_valid, access_token, _ = self.check_kite_token_validity()
         if is_valid:
             return access_token
@@ -71,7 +87,7 @@ class SessionManager:
         Checks the validity of the stored Kite token without triggering a new login.
         Returns a tuple: (is_valid, token, login_url).
         """
-        kite = KiteConnect(api_key=self.kite_api_key)
+        kite = self.get_kite_client()
         access_token = self.load_token(self.kite_token_file)
         if not access_token:
             print("ℹ️ No Kite token file found.")
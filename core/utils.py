@@ -1,8 +1,10 @@
 import logging
-import math
+import csv
+import sys
 import json
 import pandas as pd
-from typing import List, Dict
+from functools import lru_cache
+from typing import Iterable, List, Dict
 
 # ──────────────── Logging Setup ──────────────── #
 def setup_logging(level=logging.INFO):
@@ -12,42 +14,28 @@ def setup_logging(level=logging.INFO):
         datefmt="%Y-%m-%d %H:%M:%S"
     )
 
-# ──────────────── JSON Sanitization ──────────────── #
-def sanitize_for_json(data):
-    def sanitize_value(v):
-        if isinstance(v, float) and (math.isnan(v) or math.isinf(v)):
-            return None
-        return v
-
-    if isinstance(data, list):
-        return [{k: sanitize_value(v) for k, v in item.items()} for item in data]
-    elif isinstance(data, dict):
-        return {k: sanitize_value(v) for k, v in data.items()}
-    return data
-
 # ──────────────── CLI Table Printer ──────────────── #
-def print_table(rows: List[Dict], columns: List[str], title=None, spacing=4):
-    if not rows:
+def print_table(rows: Iterable[Dict], columns: List[str], title=None, spacing=4):
+    # Stringify each cell once; column widths need every row before the first line prints
+    cells = [tuple(str(row.get(col, "")) for col in columns) for row in rows]
+    if not cells:
         print("\n(No matching records found.)")
         return
 
-    col_widths = {
-        col: max(len(str(col)), max(len(str(row.get(col, ""))) for row in rows))
-        for col in columns
-    }
-    total_width = sum(col_widths.values()) + spacing * (len(columns) - 1)
+    widths = [max(len(str(col)), *(len(line[i]) for line in cells)) for i, col in enumerate(columns)]
+    total_width = sum(widths) + spacing * (len(columns) - 1)
+    gap = " " * spacing
+    rule = "-" * total_width
 
     if title:
         print(f"\n{title}")
-    print("-" * total_width)
-
-    header = (" " * spacing).join(f"{col:<{col_widths[col]}}" for col in columns)
-    print(header)
-    print("-" * total_width)
-
-    for row in rows:
-        line = (" " * spacing).join(f"{str(row.get(col, '')):<{col_widths[col]}}" for col in columns)
-        print(line)
+    print(rule)
+    print(gap.join(f"{col:<{width}}" for col, width in zip(columns, widths)))
+    print(rule)
+    sys.stdout.write("".join(
+        gap.join(cell.ljust(width) for cell, width in zip(line, widths)) + "\n"
+        for line in cells
+    ))
 
 
 # ──────────────── CSV Reader ──────────────── #
@@ -64,12 +52,59 @@ def read_csv(file_path: str) -> List[Dict]:
         logging.error(f"Failed to read CSV: {e}")
         return []
 
-def write_csv(file_path: str, data: List[Dict]):
+@lru_cache(maxsize=8)
+def _read_csv_snapshot(file_path: str, mtime: float) -> tuple:
+    return tuple(read_csv(file_path))
+
+def read_csv_cached(file_path: str) -> List[Dict]:
+    """
+    Like `read_csv`, but repeated reads of an unchanged file are served from
+    memory. The cache is keyed on the file's mtime, so writes are picked up.
+    Each call returns fresh row dicts, so callers may modify them freely.
+    """
+    return [dict(row) for row in _read_csv_snapshot(file_path, os.path.getmtime(file_path))]
+
+def select_recent_trades(trades: List[Dict], nrows: int = None, since_date=None) -> List[Dict]:
+    """
+    Narrows a tradebook to trades on or after `since_date` (by "trade_date")
+    and then to the last `nrows` rows. Both filters are optional.
+    """
+    if since_date is not None:
+        since = pd.Timestamp(since_date)
+        trade_dates = pd.to_datetime([t.get("trade_date") for t in trades], errors="coerce")
+        trades = [t for t, d in zip(trades, trade_dates) if not pd.isna(d) and d >= since]
+    if nrows is not None:
+        trades = trades[-nrows:] if nrows > 0 else []
+    return trades
+
+CSV_WRITE_BUFFER_SIZE = 1 << 20
+
+def _read_csv_header(file_path: str) -> List[str]:
+    with open(file_path, newline="") as f:
+        return next(csv.reader(f), [])
+
+def write_csv(file_path: str, data: List[Dict], append: bool = False):
+    """
+    Writes `data` to `file_path`, replacing the file. With `append=True` the rows
+    are added to the end of an existing file instead, which avoids rewriting the
+    whole file on every update. Rows are written in the existing header's column
+    order; if they carry columns the file doesn't have yet, the file is rewritten.
+    Returns False if the write failed.
+    """
     try:
+        if append and data and os.path.exists(file_path) and os.path.getsize(file_path) > 0:
+            header = _read_csv_header(file_path)
+            if header and all(k in header for row in data for k in row):
+                with open(file_path, "a", newline="", buffering=CSV_WRITE_BUFFER_SIZE) as f:
+                    csv.DictWriter(f, fieldnames=header, lineterminator="\n").writerows(data)
+                return True
+            data = read_csv(file_path) + list(data)
         df = pd.DataFrame.from_records(data)
         df.to_csv(file_path, index=False)
+        return True
     except Exception as e:
         logging.error(f"Failed to write to CSV: {e}")
+        return False
 
 def get_trade_from_tradebook(trade_id: str, tradebook: List[Dict]) -> Dict:
     """
@@ -87,6 +122,46 @@ def get_trade_from_tradebook(trade_id: str, tradebook: List[Dict]) -> Dict:
             return trade
     return None
 
+ISIN_MAPPING_FILE_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'Name-symbol-mapping.csv')
+
+@lru_cache(maxsize=1)
+def _load_isin_symbol_map(mtime: float) -> Dict[str, str]:
+    df = pd.read_csv(ISIN_MAPPING_FILE_PATH)
+    df.columns = [col.strip() for col in df.columns]
+    df = df.drop_duplicates(subset='ISIN NUMBER', keep='first')
+    return dict(zip(df['ISIN NUMBER'], df['SYMBOL']))
+
+def get_isin_symbol_map() -> Dict[str, str]:
+    """
+    Returns the {ISIN: symbol} mapping from the Name-symbol-mapping.csv file.
+    The parsed file is cached and reloaded only when it changes on disk.
+    """
+    return _load_isin_symbol_map(os.path.getmtime(ISIN_MAPPING_FILE_PATH))
+
+@lru_cache(maxsize=4)
+def _load_symbol_isin_map(csv_path: str, mtime: float) -> Dict[str, str]:
+    isin_map = {}
+    with open(csv_path, newline="") as f:
+        reader = csv.reader(f)
+        header = [col.strip() for col in next(reader)]
+        symbol_idx = header.index('SYMBOL')
+        isin_idx = header.index('ISIN NUMBER')
+        for row in reader:
+            if len(row) <= max(symbol_idx, isin_idx):
+                continue
+            symbol = row[symbol_idx].strip().upper()
+            # Keep the first row per symbol
+            if symbol not in isin_map:
+                isin_map[symbol] = row[isin_idx].strip()
+    return isin_map
+
+def get_symbol_isin_map(csv_path: str = ISIN_MAPPING_FILE_PATH) -> Dict[str, str]:
+    """
+    Returns the {SYMBOL: ISIN} mapping from a symbol mapping CSV. The parsed file
+    is cached and reloaded only when it changes on disk.
+    """
+    return _load_symbol_isin_map(csv_path, os.path.getmtime(csv_path))
+
 def get_symbol_from_isin(isin: str) -> str:
     """
     Retrieves the symbol for a given ISIN from the Name-symbol-mapping.csv file.
@@ -98,13 +173,7 @@ def get_symbol_from_isin(isin: str) -> str:
         str: The symbol corresponding to the ISIN, or None if not found.
     """
     try:
-        mapping_file_path = os.path.join(os.path.dirname(__file__), '..', 'data', 'Name-symbol-mapping.csv')
-        df = pd.read_csv(mapping_file_path)
-        df.columns = [col.strip() for col in df.columns]
-        symbol = df[df['ISIN NUMBER'] == isin]['SYMBOL'].values
-        if len(symbol) > 0:
-            return symbol[0]
-        return None
+        return get_isin_symbol_map().get(isin)
     except Exception as e:
         logging.error(f"Failed to get symbol from ISIN: {e}")
         return None
@@ -87,7 +87,7 @@ def main_menu():
         return
 
     print("🔄 Refreshing all caches...")
-    session.refresh_all_caches()
+    session.refresh_all_caches(force=True)
 
     print("🔄 Initializing application and uploading trades...")
     summary = HoldingsAnalyzer(user_id, broker_name).update_tradebook(session.broker)